@@ -0,0 +1,275 @@
+"""
+Lanceur de flotte de capteurs pour le système de gestion de climatisation intelligent.
+Simule les trois capteurs (température, humidité, pression) de nombreuses pièces dans un
+petit nombre de processus. Chaque processus ordonnance ses capteurs de manière coopérative
+(tas des prochaines échéances d'envoi), partage une seule connexion XML-RPC et remonte
+périodiquement ses statistiques d'envoi au processus principal.
+"""
+import sys
+import time
+import heapq
+import queue
+import random
+import socket
+import argparse
+import xmlrpc.client
+import logging
+import multiprocessing
+from typing import Dict, List, Optional
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Configuration du client RPC
+SERVEUR_RPC_URL = "http://localhost:8000/RPC2"
+
+# Intervalle (en secondes) de rafraîchissement de l'état des pièces et de remontée des statistiques
+INTERVALLE_ETAT_PIECES = 2.0
+INTERVALLE_STATISTIQUES = 10.0
+
+# Délai maximal (en secondes) d'un appel RPC : un appel bloqué suspendrait tous les capteurs du processus
+DELAI_RPC = 5.0
+
+
+class CapteurTemperature:
+    """Capteur de température simulé (mêmes règles que simulateur_temperature.py)"""
+    __slots__ = ('piece_id', 'temperature', 'mode_refroidissement', 'temps_refroidissement')
+    type_capteur = "temperature"
+    unite = "°C"
+    intervalle = (2.0, 4.0)
+    duree_maximale_refroidissement = 60
+
+    def __init__(self, piece_id: str):
+        self.piece_id = piece_id
+        self.temperature = random.uniform(18.0, 25.0)
+        self.mode_refroidissement = False
+        self.temps_refroidissement = 0.0
+
+    def mesurer(self, pieces: Optional[Dict]) -> float:
+        """Fait évoluer la température selon l'état de la climatisation et retourne la mesure"""
+        piece_data = pieces.get(self.piece_id) if pieces else None
+        if piece_data is None:
+            self.temperature += random.uniform(-0.2, 0.2)
+        else:
+            temperature_cible = piece_data.get('temperature_cible', 21.0)
+            if piece_data.get('climatisation_active', False):
+                self.mode_refroidissement = True
+                self.temps_refroidissement = 0.0
+
+            if self.mode_refroidissement:
+                difference = self.temperature - temperature_cible
+                vitesse_refroidissement = min(0.5, abs(difference) * 0.1)
+                if difference > 0:
+                    self.temperature -= vitesse_refroidissement
+                elif difference < -0.2:
+                    self.temperature += vitesse_refroidissement * 0.5
+                self.temps_refroidissement += random.uniform(*self.intervalle)
+                if (self.temps_refroidissement >= self.duree_maximale_refroidissement or
+                        abs(self.temperature - temperature_cible) < 0.3):
+                    self.mode_refroidissement = False
+            else:
+                self.temperature += random.uniform(-0.2, 0.2)
+
+        self.temperature = max(min(self.temperature, 30.0), 15.0)
+        return round(self.temperature, 1)
+
+
+class CapteurHumidite:
+    """Capteur d'humidité simulé (mêmes règles que simulateur_humidite.py)"""
+    __slots__ = ('piece_id', 'humidite')
+    type_capteur = "humidite"
+    unite = "%"
+    intervalle = (20.0, 30.0)
+
+    def __init__(self, piece_id: str):
+        self.piece_id = piece_id
+        self.humidite = random.uniform(40.0, 60.0)
+
+    def mesurer(self, pieces: Optional[Dict]) -> float:
+        """Fait varier légèrement l'humidité et retourne la mesure"""
+        self.humidite += random.uniform(-1.0, 1.0)
+        self.humidite = max(min(self.humidite, 80.0), 20.0)
+        return round(self.humidite, 1)
+
+
+class CapteurPression:
+    """Capteur de pression simulé (mêmes règles que simulateur_pression.py)"""
+    __slots__ = ('piece_id', 'pression')
+    type_capteur = "pression"
+    unite = "hPa"
+    intervalle = (5.0, 6.0)
+
+    def __init__(self, piece_id: str):
+        self.piece_id = piece_id
+        self.pression = random.uniform(1000.0, 1025.0)
+
+    def mesurer(self, pieces: Optional[Dict]) -> float:
+        """Fait varier légèrement la pression et retourne la mesure"""
+        self.pression += random.uniform(-0.5, 0.5)
+        self.pression = max(min(self.pression, 1040.0), 975.0)
+        return round(self.pression, 1)
+
+
+TYPES_CAPTEURS = (CapteurTemperature, CapteurHumidite, CapteurPression)
+
+
+class _DelaiConnexion:
+    """Applique un délai d'attente aux sockets des connexions créées par le transport XML-RPC"""
+
+    def __init__(self, delai: float, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delai = delai
+
+    def make_connection(self, host):
+        connexion = super().make_connection(host)
+        connexion.timeout = self.delai
+        return connexion
+
+
+class TransportAvecDelai(_DelaiConnexion, xmlrpc.client.Transport):
+    """Transport HTTP XML-RPC avec délai d'attente"""
+
+
+class TransportSecuriseAvecDelai(_DelaiConnexion, xmlrpc.client.SafeTransport):
+    """Transport HTTPS XML-RPC avec délai d'attente"""
+
+
+def creer_proxy(url: str, delai: float) -> xmlrpc.client.ServerProxy:
+    """Crée un proxy XML-RPC dont chaque appel échoue (socket.timeout) au-delà du délai"""
+    transport = TransportSecuriseAvecDelai(delai) if url.startswith('https:') else TransportAvecDelai(delai)
+    return xmlrpc.client.ServerProxy(url, transport=transport)
+
+
+def executer_worker(numero: int, pieces_ids: List[str], url: str, file_statistiques,
+                    delai: float = DELAI_RPC) -> None:
+    """
+    Boucle d'un processus worker : ordonnance coopérativement les capteurs de ses pièces
+    dans un seul thread, en envoyant toujours le capteur dont l'échéance est la plus proche.
+    """
+    proxy = creer_proxy(url, delai)  # Connexion partagée par tous les capteurs du processus
+    maintenant = time.monotonic()
+
+    # Tas (echeance, numero_capteur, capteur) ; les premiers envois sont étalés sur un intervalle
+    echeancier = []
+    numero_capteur = 0
+    for piece_id in pieces_ids:
+        for type_capteur in TYPES_CAPTEURS:
+            capteur = type_capteur(piece_id)
+            echeance = maintenant + random.uniform(0.0, capteur.intervalle[1])
+            echeancier.append((echeance, numero_capteur, capteur))
+            numero_capteur += 1
+    heapq.heapify(echeancier)
+
+    etat_pieces: Optional[Dict] = None
+    prochain_etat = maintenant
+    prochaines_stats = maintenant + INTERVALLE_STATISTIQUES
+    envois = erreurs = 0
+
+    while echeancier:
+        echeance, numero_capteur, capteur = echeancier[0]
+        attente = echeance - time.monotonic()
+        if attente > 0:
+            time.sleep(attente)
+        maintenant = time.monotonic()
+
+        # État des pièces partagé par tous les capteurs de température du processus
+        if capteur.type_capteur == "temperature" and maintenant >= prochain_etat:
+            try:
+                etat_pieces = proxy.obtenir_donnees_pieces()
+            except Exception as e:
+                logger.warning(f"Worker {numero}: impossible de récupérer les données des pièces: {e}")
+                etat_pieces = None
+            prochain_etat = maintenant + INTERVALLE_ETAT_PIECES
+
+        valeur = capteur.mesurer(etat_pieces)
+        try:
+            if proxy.enregistrer_donnees_capteur(capteur.piece_id, capteur.type_capteur, valeur, capteur.unite):
+                envois += 1
+            else:
+                erreurs += 1
+        except socket.timeout:
+            erreurs += 1
+            logger.warning(f"Worker {numero}: délai dépassé lors de l'envoi ({capteur.piece_id}/{capteur.type_capteur})")
+        except Exception as e:
+            erreurs += 1
+            logger.debug(f"Worker {numero}: erreur lors de l'envoi ({capteur.piece_id}/{capteur.type_capteur}): {e}")
+
+        heapq.heapreplace(echeancier, (maintenant + random.uniform(*capteur.intervalle), numero_capteur, capteur))
+
+        if maintenant >= prochaines_stats:
+            file_statistiques.put((numero, envois, erreurs))
+            envois = erreurs = 0
+            prochaines_stats = maintenant + INTERVALLE_STATISTIQUES
+
+
+def lire_pieces(fichier: Optional[str], nombre: int, prefixe: str) -> List[str]:
+    """Retourne la liste des pièces à simuler, lue depuis un fichier (une par ligne) ou générée"""
+    if fichier:
+        with open(fichier, encoding='utf-8') as f:
+            return [ligne.strip() for ligne in f if ligne.strip() and not ligne.startswith('#')]
+    return [f"{prefixe}{i}" for i in range(1, nombre + 1)]
+
+
+def lancer_flotte(pieces_ids: List[str], nb_processus: int, url: str, delai: float = DELAI_RPC) -> None:
+    """Répartit les pièces entre les processus workers et affiche les statistiques agrégées"""
+    nb_processus = max(1, min(nb_processus, len(pieces_ids)))
+    file_statistiques = multiprocessing.Queue()
+    processus = []
+    for numero in range(nb_processus):
+        p = multiprocessing.Process(
+            target=executer_worker,
+            args=(numero, pieces_ids[numero::nb_processus], url, file_statistiques, delai),
+            name=f"flotte-{numero}",
+            daemon=True
+        )
+        p.start()
+        processus.append(p)
+
+    logger.info(f"Flotte démarrée: {len(pieces_ids)} pièces, {3 * len(pieces_ids)} capteurs, "
+                f"{nb_processus} processus")
+
+    total_envois = total_erreurs = 0
+    debut = time.monotonic()
+    try:
+        while any(p.is_alive() for p in processus):
+            envois = erreurs = 0
+            fin_periode = time.monotonic() + INTERVALLE_STATISTIQUES
+            while time.monotonic() < fin_periode:
+                try:
+                    _, e, r = file_statistiques.get(timeout=max(0.1, fin_periode - time.monotonic()))
+                except queue.Empty:
+                    continue
+                envois += e
+                erreurs += r
+            total_envois += envois
+            total_erreurs += erreurs
+            duree = time.monotonic() - debut
+            logger.info(f"Débit: {envois / INTERVALLE_STATISTIQUES:.1f} envois/s "
+                        f"(moyenne {total_envois / duree:.1f}/s), erreurs: {erreurs} "
+                        f"(total {total_erreurs})")
+    except KeyboardInterrupt:
+        logger.info("Arrêt de la flotte")
+    finally:
+        for p in processus:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lance une flotte de capteurs simulés pour de nombreuses pièces")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--fichier', help="Fichier contenant un identifiant de pièce par ligne")
+    source.add_argument('--nombre', type=int, help="Nombre de pièces à générer")
+    parser.add_argument('--prefixe', default="piece-", help="Préfixe des pièces générées (défaut: piece-)")
+    parser.add_argument('--processus', type=int, default=2, help="Nombre de processus workers (défaut: 2)")
+    parser.add_argument('--url', default=SERVEUR_RPC_URL, help=f"URL du serveur RPC (défaut: {SERVEUR_RPC_URL})")
+    parser.add_argument('--delai', type=float, default=DELAI_RPC,
+                        help=f"Délai maximal d'un appel RPC en secondes (défaut: {DELAI_RPC})")
+    args = parser.parse_args()
+
+    pieces = lire_pieces(args.fichier, args.nombre or 0, args.prefixe)
+    if not pieces:
+        print("Aucune pièce à simuler")
+        sys.exit(1)
+
+    lancer_flotte(pieces, args.processus, args.url, args.delai)
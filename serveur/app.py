@@ -4,36 +4,98 @@ Combine un serveur XML-RPC pour recevoir les données des capteurs
 et un serveur Flask pour servir l'interface web et les API REST.
 Version modifiée avec gestion intégrée des capteurs.
 """
+import os
+import hmac
+import time
 import threading
+import xmlrpc.client
 import xmlrpc.server
 from xmlrpc.server import SimpleXMLRPCServer
+from functools import wraps
 from flask import Flask, render_template, jsonify, request, Response
 from modeles import GestionnairePieces
 from gestionnaire_capteur import gestionnaire_capteurs
+from file_ingestion import FileIngestion
+from compression import compresser_reponse
+from planification import PlanificateurConsignes, CIBLE_PIECE, CIBLE_ZONE
+import diagnostic
+from federation import HubFederation, analyser_sites
+from flux_evenements import SuiviFluxEvenements
+from stockage_froid import StockageFroid
+from commandes import PipelineCommandes, CHAMPS_COMMANDE
 import logging
-import json
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Cycle de vie des pièces (optionnel) : éviction des pièces inactives depuis CLIM_TTL_PIECES secondes
+# (0, par défaut : désactivée), déposées dans le stockage froid CLIM_STOCKAGE_FROID (fichier SQLite)
+# s'il est défini ; sans stockage froid, les pièces évincées et leurs réglages sont oubliés
+TTL_PIECES = float(os.environ.get('CLIM_TTL_PIECES', 0))
+INTERVALLE_EVICTION = 60.0
+CHEMIN_STOCKAGE_FROID = os.environ.get('CLIM_STOCKAGE_FROID', '')
+
 # Initialisation du gestionnaire de pièces (singleton)
-gestionnaire_pieces = GestionnairePieces()
+gestionnaire_pieces = GestionnairePieces(
+    ttl=TTL_PIECES or None,
+    stockage_froid=StockageFroid(CHEMIN_STOCKAGE_FROID) if CHEMIN_STOCKAGE_FROID else None
+)
+
+# File d'ingestion bornée entre la réception RPC et l'application des mesures
+# Politiques de délestage : 'rejeter' (réessai côté capteur) ou 'evincer_plus_ancien'
+file_ingestion = FileIngestion(
+    gestionnaire_pieces.enregistrer_donnees_capteurs,
+    capacite=int(os.environ.get('CLIM_INGESTION_CAPACITE', 10000)),
+    nb_workers=int(os.environ.get('CLIM_INGESTION_WORKERS', 2)),
+    politique=os.environ.get('CLIM_INGESTION_POLITIQUE', 'rejeter')
+)
+
+# Pipeline des commandes de contrôle : fusion par (pièce, champ) sur une courte fenêtre, puis application par lot
+pipeline_commandes = PipelineCommandes(
+    gestionnaire_pieces.appliquer_commandes,
+    fenetre=float(os.environ.get('CLIM_COMMANDES_FENETRE', 0.05))
+)
+
+# Planificateur horaire des températures cibles (programmes par pièce et par zone)
+planificateur = PlanificateurConsignes(gestionnaire_pieces)
+
+# Mode hub : fédération de plusieurs serveurs de bâtiment (CLIM_SITES="site1=http://...,site2=http://...")
+SITES_FEDERES = analyser_sites(os.environ.get('CLIM_SITES', ''))
+hub = HubFederation(gestionnaire_pieces, SITES_FEDERES) if SITES_FEDERES else None
+
+# Outils de diagnostic à chaud, réservés à l'administration (jeton CLIM_ADMIN_TOKEN)
+JETON_ADMIN = os.environ.get('CLIM_ADMIN_TOKEN', '')
+DUREE_PROFILAGE_MAX = 60.0
+NB_FRAMES_MAX = 100
+profileur = diagnostic.ProfileurEchantillonnage()
+traceur_allocations = diagnostic.TraceurAllocations()
+
+# Code d'erreur XML-RPC renvoyé lorsque la file d'ingestion est pleine
+CODE_FILE_PLEINE = 503
 
 # Configuration du serveur XML-RPC
 class RPCHandler:
     def enregistrer_donnees_capteur(self, id_piece, type_capteur, valeur, unite):
         """
         Méthode RPC pour l'enregistrement des données des capteurs
+        La mesure est acquittée dès sa mise en file ; elle est appliquée par les workers d'ingestion.
         """
         try:
             valeur = float(valeur)
             logger.info(f"Données reçues - Pièce: {id_piece}, Capteur: {type_capteur}, Valeur: {valeur} {unite}")
-            gestionnaire_pieces.enregistrer_donnee_capteur(id_piece, type_capteur, valeur, unite)
-            return True
+            accepte = file_ingestion.soumettre(id_piece, type_capteur, valeur, unite)
         except Exception as e:
             logger.error(f"Erreur lors de l'enregistrement des données: {e}")
             return False
+        
+        if not accepte:
+            # File pleine : refus explicite avec un délai de nouvel essai
+            raise xmlrpc.client.Fault(
+                CODE_FILE_PLEINE,
+                f"File d'ingestion pleine, réessayer dans {file_ingestion.delai_reessai} s"
+            )
+        return True
     
     def obtenir_donnees_pieces(self):
         """
@@ -56,6 +118,19 @@ def demarrer_serveur_rpc():
     logger.info(f"Serveur RPC démarré sur http://{adresse_rpc[0]}:{adresse_rpc[1]}/RPC2")
     serveur.serve_forever()
 
+def evincer_pieces_en_continu():
+    """
+    Évince périodiquement les pièces inactives du gestionnaire principal
+    """
+    while True:
+        time.sleep(INTERVALLE_EVICTION)
+        try:
+            nombre = gestionnaire_pieces.evincer_pieces_inactives()
+            if nombre:
+                logger.info(f"{nombre} pièce(s) inactive(s) évincée(s)")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'éviction des pièces inactives: {e}")
+
 # Configuration du serveur Flask et des API REST
 app = Flask(__name__)
 
@@ -66,41 +141,166 @@ def index():
     """
     return render_template('index.html')
 
+# Nombre maximal de pièces par page pour /api/pieces
+LIMITE_PAGE_MAX = 1000
+
+@app.after_request
+def compresser(response):
+    """
+    Compresse les réponses volumineuses (gzip/deflate) selon l'en-tête Accept-Encoding
+    """
+    return compresser_reponse(request, response)
+
 @app.route('/api/pieces', methods=['GET'])
 def api_pieces():
     """
-    API pour obtenir toutes les pièces et leurs données actuelles
+    API pour obtenir les pièces et leurs données actuelles, ordonnées par identifiant
+    - prefixe : ne retourne que les pièces dont l'identifiant commence par ce préfixe
+    - champs : liste de champs séparés par des virgules (ex: temperature,climatisation_active)
+    - limite / curseur : pagination ; la réponse contient alors les pièces et le curseur suivant
+    Sans pagination, la réponse est le dictionnaire {id_piece: pièce} comme auparavant.
     """
-    pieces = gestionnaire_pieces.obtenir_toutes_pieces()
+    prefixe = request.args.get('prefixe', '')
+    curseur = request.args.get('curseur')
+    champs = request.args.get('champs')
+    champs = [champ.strip() for champ in champs.split(',') if champ.strip()] if champs else None
     
-    # Conversion en dictionnaire pour la sérialisation JSON
-    resultat = {}
-    for id_piece, piece in pieces.items():
-        resultat[id_piece] = {
-            'id': piece.id,
-            'temperature': {
-                'valeur': piece.temperature.valeur,
-                'unite': piece.temperature.unite,
-                'timestamp': piece.temperature.timestamp
-            } if piece.temperature else None,
-            'humidite': {
-                'valeur': piece.humidite.valeur,
-                'unite': piece.humidite.unite,
-                'timestamp': piece.humidite.timestamp
-            } if piece.humidite else None,
-            'pression': {
-                'valeur': piece.pression.valeur,
-                'unite': piece.pression.unite,
-                'timestamp': piece.pression.timestamp
-            } if piece.pression else None,
-            'temperature_cible': piece.temperature_cible,
-            'climatisation_active': piece.climatisation_active,
-            'mode_automatique': piece.mode_automatique
-        }
+    try:
+        limite = int(request.args['limite']) if 'limite' in request.args else None
+        if limite is not None and not 0 < limite <= LIMITE_PAGE_MAX:
+            raise ValueError(f"La limite doit être comprise entre 1 et {LIMITE_PAGE_MAX}")
+        pieces, curseur_suivant = gestionnaire_pieces.obtenir_page_pieces(curseur, limite, prefixe, champs)
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
     
-    return jsonify(resultat)
+    if limite is None and curseur is None:
+        return jsonify(pieces)
+    return jsonify({
+        'pieces': pieces,
+        'curseur_suivant': curseur_suivant
+    })
 
-@app.route('/api/pieces/<id_piece>/temperature-cible', methods=['POST'])
+@app.route('/api/pieces/changements', methods=['GET'])
+def api_changements_pieces():
+    """
+    API pour la synchronisation par deltas (utilisée par le hub de fédération)
+    - depuis : version du dernier appel ; seules les pièces modifiées depuis sont retournées
+    L'identifiant d'instance change à chaque redémarrage du serveur (les versions repartent de 0).
+    - supprimees : pièces retirées (évincées ou supprimées) depuis cette version
+    - complet : vrai si toutes les pièces sont retournées ; l'abonné doit alors oublier les autres
+    """
+    try:
+        depuis = int(request.args.get('depuis', 0))
+    except ValueError:
+        return jsonify({'erreur': 'Version invalide'}), 400
+    
+    pieces, supprimees, complet, version = gestionnaire_pieces.obtenir_changements(depuis)
+    return jsonify({
+        'instance': gestionnaire_pieces.instance,
+        'version': version,
+        'pieces': pieces,
+        'supprimees': supprimees,
+        'complet': complet
+    })
+
+# Commande et clé du serveur propriétaire correspondant à chaque champ (relais du mode hub)
+COMMANDES_RELAYEES = {
+    'temperature_cible': ('temperature-cible', 'temperature'),
+    'climatisation_active': ('climatisation', 'active'),
+    'mode_automatique': ('mode-automatique', 'auto'),
+}
+
+def relayer_commande(id_piece, commande, data):
+    """
+    Relaie une commande destinée à une pièce fédérée vers le serveur du site propriétaire
+    """
+    statut, reponse = hub.relayer_commande(id_piece, commande, data)
+    return jsonify(reponse), statut
+
+@app.route('/api/federation/sites', methods=['GET'])
+def api_sites_federes():
+    """
+    API pour obtenir l'état de synchronisation des sites fédérés (mode hub)
+    """
+    if not hub:
+        return jsonify({'erreur': 'Mode hub non activé (CLIM_SITES non défini)'}), 404
+    return jsonify(hub.obtenir_etat_sites())
+
+def executer_commande(id_piece, champ, valeur):
+    """
+    Soumet une commande au pipeline et acquitte avec la valeur finale du champ après fusion
+    """
+    try:
+        resultat = pipeline_commandes.executer([(id_piece, champ, valeur)])[id_piece]
+    except TimeoutError as e:
+        return jsonify({'erreur': str(e)}), 503
+    if resultat is None:
+        return jsonify({'erreur': 'Pièce introuvable'}), 404
+    return jsonify({'succes': True, champ: resultat[champ]})
+
+@app.route('/api/commandes', methods=['POST'])
+def api_commandes():
+    """
+    API pour envoyer un lot de commandes de contrôle
+    - commandes : liste de {piece, champ, valeur}, champ parmi temperature_cible, climatisation_active
+      et mode_automatique ; pour un même champ d'une même pièce, la dernière commande l'emporte
+    Retourne les valeurs finales par pièce et la liste des pièces introuvables.
+    """
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('commandes'), list):
+        return jsonify({'erreur': 'Liste de commandes manquante'}), 400
+    
+    commandes = []
+    for commande in data['commandes']:
+        if not isinstance(commande, dict) or not {'piece', 'champ', 'valeur'} <= commande.keys():
+            return jsonify({'erreur': 'Commande invalide (piece, champ et valeur attendus)'}), 400
+        if commande['champ'] not in CHAMPS_COMMANDE:
+            return jsonify({'erreur': f"Champ de commande inconnu: {commande['champ']}"}), 400
+        commandes.append((str(commande['piece']), commande['champ'], commande['valeur']))
+    
+    # Les commandes des pièces fédérées sont relayées, après fusion, à leur site propriétaire
+    pieces = {}
+    introuvables = []
+    if hub:
+        relayees = {}
+        for id_piece, champ, valeur in commandes:
+            if hub.site_de(id_piece):
+                champs = relayees.setdefault(id_piece, {})
+                champs.pop(champ, None)
+                champs[champ] = valeur
+        for id_piece, champs in relayees.items():
+            for champ, valeur in champs.items():
+                commande_site, cle = COMMANDES_RELAYEES[champ]
+                statut, reponse = hub.relayer_commande(id_piece, commande_site, {cle: valeur})
+                if statut == 404:
+                    introuvables.append(id_piece)
+                    break
+                if statut != 200:
+                    return jsonify(reponse), statut
+                pieces.setdefault(id_piece, {})[champ] = reponse.get(champ, valeur)
+        commandes = [commande for commande in commandes if commande[0] not in relayees]
+    
+    try:
+        resultats = pipeline_commandes.executer(commandes) if commandes else {}
+    except ValueError:
+        return jsonify({'erreur': 'Valeur de commande invalide'}), 400
+    except TimeoutError as e:
+        return jsonify({'erreur': str(e)}), 503
+    for id_piece, resultat in resultats.items():
+        if resultat is None:
+            introuvables.append(id_piece)
+        else:
+            pieces[id_piece] = resultat
+    return jsonify({'succes': True, 'pieces': pieces, 'introuvables': introuvables})
+
+@app.route('/api/commandes/statistiques', methods=['GET'])
+def api_statistiques_commandes():
+    """
+    API pour obtenir les compteurs du pipeline de commandes (reçues, fusionnées, lots appliqués)
+    """
+    return jsonify(pipeline_commandes.obtenir_statistiques())
+
+@app.route('/api/pieces/<path:id_piece>/temperature-cible', methods=['POST'])
 def api_definir_temperature_cible(id_piece):
     """
     API pour définir la température cible d'une pièce
@@ -109,14 +309,15 @@ def api_definir_temperature_cible(id_piece):
     if 'temperature' not in data:
         return jsonify({'erreur': 'Température manquante'}), 400
     
+    if hub and hub.site_de(id_piece):
+        return relayer_commande(id_piece, 'temperature-cible', data)
+    
     try:
-        temperature = float(data['temperature'])
-        gestionnaire_pieces.definir_temperature_cible(id_piece, temperature)
-        return jsonify({'succes': True, 'temperature_cible': temperature})
+        return executer_commande(id_piece, 'temperature_cible', data['temperature'])
     except ValueError:
         return jsonify({'erreur': 'Valeur de température invalide'}), 400
 
-@app.route('/api/pieces/<id_piece>/climatisation', methods=['POST'])
+@app.route('/api/pieces/<path:id_piece>/climatisation', methods=['POST'])
 def api_definir_etat_climatisation(id_piece):
     """
     API pour définir l'état de la climatisation d'une pièce
@@ -125,14 +326,15 @@ def api_definir_etat_climatisation(id_piece):
     if 'active' not in data:
         return jsonify({'erreur': 'État de climatisation manquant'}), 400
     
+    if hub and hub.site_de(id_piece):
+        return relayer_commande(id_piece, 'climatisation', data)
+    
     try:
-        active = bool(data['active'])
-        gestionnaire_pieces.definir_etat_climatisation(id_piece, active)
-        return jsonify({'succes': True, 'climatisation_active': active})
+        return executer_commande(id_piece, 'climatisation_active', data['active'])
     except ValueError:
         return jsonify({'erreur': 'Valeur d\'état invalide'}), 400
 
-@app.route('/api/pieces/<id_piece>/mode-automatique', methods=['POST'])
+@app.route('/api/pieces/<path:id_piece>/mode-automatique', methods=['POST'])
 def api_definir_mode_automatique(id_piece):
     """
     API pour définir le mode automatique d'une pièce
@@ -141,10 +343,11 @@ def api_definir_mode_automatique(id_piece):
     if 'auto' not in data:
         return jsonify({'erreur': 'Mode automatique manquant'}), 400
     
+    if hub and hub.site_de(id_piece):
+        return relayer_commande(id_piece, 'mode-automatique', data)
+    
     try:
-        auto = bool(data['auto'])
-        gestionnaire_pieces.definir_mode_automatique(id_piece, auto)
-        return jsonify({'succes': True, 'mode_automatique': auto})
+        return executer_commande(id_piece, 'mode_automatique', data['auto'])
     except ValueError:
         return jsonify({'erreur': 'Valeur de mode invalide'}), 400
 
@@ -206,8 +409,10 @@ def api_ajouter_piece_capteurs():
 def api_supprimer_piece_capteurs(piece_id):
     """
     API pour supprimer une pièce et ses capteurs
+    - La pièce est aussi retirée du gestionnaire principal (mémoire, stockage froid et historique)
     """
     gestionnaire_capteurs.supprimer_piece(piece_id)
+    gestionnaire_pieces.supprimer_piece(piece_id)
     return jsonify({
         'succes': True,
         'message': f'Pièce "{piece_id}" supprimée avec succès'
@@ -257,58 +462,300 @@ def api_arreter_capteur(piece_id, type_capteur):
         'message': f'Capteur {type_capteur} arrêté pour la pièce "{piece_id}"'
     })
 
+@app.route('/api/anomalies', methods=['GET'])
+def api_anomalies():
+    """
+    API pour obtenir les anomalies détectées sur les capteurs
+    - depuis : numéro de séquence à partir duquel lister les anomalies
+    - limite : nombre maximal d'anomalies retournées (les plus anciennes après `depuis`, pour paginer sans trou)
+    """
+    try:
+        depuis = int(request.args.get('depuis', 0))
+        limite = int(request.args['limite']) if 'limite' in request.args else None
+        if limite is not None and limite < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'erreur': 'Paramètres de pagination invalides'}), 400
+    
+    detecteur = gestionnaire_pieces.detecteur_anomalies
+    return jsonify({
+        'anomalies': detecteur.obtenir_anomalies(depuis, limite),
+        'sequence': detecteur.derniere_sequence()
+    })
+
+@app.route('/api/capteurs/obsoletes', methods=['GET'])
+def api_capteurs_obsoletes():
+    """
+    API pour obtenir les capteurs qui ont cessé d'émettre (capteurs obsolètes)
+    """
+    return jsonify({
+        'obsoletes': gestionnaire_pieces.index_obsolescence.obtenir_obsoletes()
+    })
+
+@app.route('/api/ingestion/statistiques', methods=['GET'])
+def api_statistiques_ingestion():
+    """
+    API pour obtenir la profondeur de la file d'ingestion et les compteurs de délestage
+    """
+    return jsonify(file_ingestion.obtenir_statistiques())
+
+# === ROUTES DE PLANIFICATION HORAIRE ===
+
+@app.route('/api/planification', methods=['GET'])
+def api_obtenir_planification():
+    """
+    API pour obtenir les programmes horaires des pièces et des zones
+    """
+    return jsonify(planificateur.obtenir_programmes())
+
+@app.route('/api/planification/pieces/<path:id_piece>', methods=['POST'])
+def api_definir_programme_piece(id_piece):
+    """
+    API pour définir le programme horaire d'une pièce
+    Corps: {"transitions": [{"heure": "08:00", "temperature": 22, "jours": [0, 1, 2, 3, 4]}, ...]}
+    """
+    data = request.json
+    if 'transitions' not in data:
+        return jsonify({'erreur': 'Transitions manquantes'}), 400
+    
+    # La consigne d'une pièce fédérée est remplacée à chaque synchronisation : le programme doit
+    # être défini sur le serveur du site propriétaire
+    if hub and hub.site_de(id_piece):
+        return jsonify({'erreur': 'Pièce fédérée : définir le programme sur le serveur de son site'}), 409
+    
+    try:
+        planificateur.definir_programme_piece(id_piece, data['transitions'])
+        return jsonify({'succes': True, 'piece_id': id_piece})
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+
+@app.route('/api/planification/zones/<zone>', methods=['POST'])
+def api_definir_programme_zone(zone):
+    """
+    API pour définir le programme horaire d'une zone
+    Corps: {"pieces": ["bureau-1", "bureau-2"], "transitions": [...]}
+    """
+    data = request.json
+    if 'transitions' not in data or 'pieces' not in data:
+        return jsonify({'erreur': 'Pièces ou transitions manquantes'}), 400
+    
+    if hub and isinstance(data['pieces'], list) and any(
+            isinstance(id_piece, str) and hub.site_de(id_piece) for id_piece in data['pieces']):
+        return jsonify({'erreur': 'Pièces fédérées : définir le programme sur le serveur de leur site'}), 409
+    
+    try:
+        planificateur.definir_programme_zone(zone, data['pieces'], data['transitions'])
+        return jsonify({'succes': True, 'zone': zone})
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+
+@app.route('/api/planification/pieces/<path:id_piece>', methods=['DELETE'])
+def api_supprimer_programme_piece(id_piece):
+    """
+    API pour supprimer le programme horaire d'une pièce
+    """
+    if not planificateur.supprimer_programme(CIBLE_PIECE, id_piece):
+        return jsonify({'erreur': 'Programme introuvable'}), 404
+    return jsonify({'succes': True})
+
+@app.route('/api/planification/zones/<zone>', methods=['DELETE'])
+def api_supprimer_programme_zone(zone):
+    """
+    API pour supprimer le programme horaire d'une zone
+    """
+    if not planificateur.supprimer_programme(CIBLE_ZONE, zone):
+        return jsonify({'erreur': 'Programme introuvable'}), 404
+    return jsonify({'succes': True})
+
+# === ROUTES DE CONSOMMATION (TEMPS DE FONCTIONNEMENT DE LA CLIMATISATION) ===
+
+@app.route('/api/pieces/<path:id_piece>/consommation', methods=['GET'])
+def api_consommation_piece(id_piece):
+    """
+    API pour obtenir le temps de fonctionnement de la climatisation d'une pièce
+    - heures : nombre de tranches horaires retournées (défaut 24, maximum 48)
+    - jours : nombre de tranches journalières retournées (défaut 7, maximum 31)
+    """
+    try:
+        nb_heures = int(request.args.get('heures', 24))
+        nb_jours = int(request.args.get('jours', 7))
+    except ValueError:
+        return jsonify({'erreur': 'Nombre de tranches invalide'}), 400
+    
+    if gestionnaire_pieces.trouver_piece(id_piece) is None:
+        return jsonify({'erreur': 'Pièce introuvable'}), 404
+    
+    consommation = gestionnaire_pieces.compteur_consommation.obtenir_consommation(id_piece, nb_heures, nb_jours)
+    return jsonify(consommation)
+
+@app.route('/api/zones/<zone>/consommation', methods=['GET'])
+def api_consommation_zone(zone):
+    """
+    API pour obtenir le temps de fonctionnement cumulé des pièces d'une zone de planification
+    """
+    pieces = planificateur.obtenir_pieces_zone(zone)
+    if pieces is None:
+        return jsonify({'erreur': 'Zone introuvable'}), 404
+    
+    try:
+        nb_heures = int(request.args.get('heures', 24))
+        nb_jours = int(request.args.get('jours', 7))
+    except ValueError:
+        return jsonify({'erreur': 'Nombre de tranches invalide'}), 400
+    
+    consommation = gestionnaire_pieces.compteur_consommation.obtenir_consommation_zone(pieces, nb_heures, nb_jours)
+    consommation['zone'] = zone
+    return jsonify(consommation)
+
+@app.route('/api/consommation/classement', methods=['GET'])
+def api_classement_consommation():
+    """
+    API pour obtenir les pièces dont la climatisation a le plus fonctionné
+    - periode : 'heure' ou 'jour' en cours (défaut 'jour')
+    - nombre : nombre de pièces retournées (défaut 10)
+    """
+    try:
+        nombre = int(request.args.get('nombre', 10))
+        classement = gestionnaire_pieces.compteur_consommation.obtenir_classement(
+            nombre, request.args.get('periode', 'jour'))
+    except ValueError as e:
+        return jsonify({'erreur': str(e)}), 400
+    return jsonify({'classement': classement})
+
+# === ROUTES DE DIAGNOSTIC (ADMINISTRATION) ===
+
+def admin_requis(fonction):
+    """
+    Décorateur réservant une route aux administrateurs (en-tête X-Admin-Token)
+    Les routes sont désactivées si aucun jeton n'est configuré.
+    """
+    @wraps(fonction)
+    def verifier(*args, **kwargs):
+        if not JETON_ADMIN:
+            return jsonify({'erreur': 'Diagnostic désactivé (CLIM_ADMIN_TOKEN non défini)'}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), JETON_ADMIN):
+            return jsonify({'erreur': 'Accès réservé aux administrateurs'}), 403
+        return fonction(*args, **kwargs)
+    return verifier
+
+@app.route('/api/admin/profil', methods=['POST'])
+@admin_requis
+def api_profiler():
+    """
+    API pour profiler le serveur par échantillonnage des piles de tous les threads
+    - duree : durée du profilage en secondes (défaut 10, maximum 60)
+    - intervalle : intervalle d'échantillonnage en secondes (défaut 0.005)
+    """
+    try:
+        duree = float(request.args.get('duree', 10))
+        intervalle = float(request.args.get('intervalle', 0.005))
+        if not 0 < duree <= DUREE_PROFILAGE_MAX or intervalle <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'erreur': 'Durée ou intervalle invalide'}), 400
+    
+    try:
+        return jsonify(profileur.profiler(duree, intervalle))
+    except RuntimeError as e:
+        return jsonify({'erreur': str(e)}), 409
+
+@app.route('/api/admin/threads', methods=['GET'])
+@admin_requis
+def api_temps_cpu_threads():
+    """
+    API pour obtenir le temps CPU par thread, agrégé par rôle (RPC, Flask, SSE, simulateur...)
+    """
+    return jsonify(diagnostic.obtenir_temps_cpu_threads())
+
+@app.route('/api/admin/allocations', methods=['POST'])
+@admin_requis
+def api_demarrer_allocations():
+    """
+    API pour démarrer le traçage des allocations et prendre l'instantané de référence
+    - frames : profondeur de pile mémorisée par allocation (défaut 10, maximum 100)
+    """
+    try:
+        nb_frames = int(request.args.get('frames', 10))
+        if not 1 <= nb_frames <= NB_FRAMES_MAX:
+            raise ValueError
+    except ValueError:
+        return jsonify({'erreur': 'Nombre de frames invalide'}), 400
+    
+    traceur_allocations.demarrer(nb_frames)
+    return jsonify({'succes': True})
+
+@app.route('/api/admin/allocations', methods=['GET'])
+@admin_requis
+def api_difference_allocations():
+    """
+    API pour obtenir les principaux sites d'allocation depuis l'instantané de référence
+    - limite : nombre de sites d'allocation retournés (défaut 25)
+    - reference=1 : le nouvel instantané devient la référence
+    """
+    try:
+        limite = int(request.args.get('limite', 25))
+        if limite < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'erreur': 'Limite invalide'}), 400
+    
+    try:
+        return jsonify(traceur_allocations.difference(limite, request.args.get('reference') == '1'))
+    except RuntimeError as e:
+        return jsonify({'erreur': str(e)}), 409
+
+@app.route('/api/admin/allocations', methods=['DELETE'])
+@admin_requis
+def api_arreter_allocations():
+    """
+    API pour arrêter le traçage des allocations
+    """
+    traceur_allocations.arreter()
+    return jsonify({'succes': True})
+
 @app.route('/api/stream')
 def stream():
     """
     API pour le streaming des mises à jour (Server-Sent Events)
     """
     def event_stream():
-        last_data = {}
+        diagnostic.etiqueter_thread('sse')
+        try:
+            yield from boucle_stream()
+        finally:
+            diagnostic.retirer_etiquette_thread()
+    
+    def boucle_stream():
+        suivi = SuiviFluxEvenements(gestionnaire_pieces)
         while True:
-            # Récupération des données des pièces
-            pieces = gestionnaire_pieces.obtenir_toutes_pieces()
-            
-            # Conversion en dictionnaire pour la sérialisation
-            current_data = {}
-            for id_piece, piece in pieces.items():
-                current_data[id_piece] = {
-                    'id': piece.id,
-                    'temperature': {
-                        'valeur': piece.temperature.valeur,
-                        'unite': piece.temperature.unite,
-                        'timestamp': piece.temperature.timestamp
-                    } if piece.temperature else None,
-                    'humidite': {
-                        'valeur': piece.humidite.valeur,
-                        'unite': piece.humidite.unite,
-                        'timestamp': piece.humidite.timestamp
-                    } if piece.humidite else None,
-                    'pression': {
-                        'valeur': piece.pression.valeur,
-                        'unite': piece.pression.unite,
-                        'timestamp': piece.pression.timestamp
-                    } if piece.pression else None,
-                    'temperature_cible': piece.temperature_cible,
-                    'climatisation_active': piece.climatisation_active,
-                    'mode_automatique': piece.mode_automatique
-                }
-            
-            # Envoyer uniquement si les données ont changé
-            if current_data != last_data:
-                last_data = current_data
-                yield f"data: {json.dumps(current_data)}\n\n"
+            # État des pièces (si modifié), anomalies et capteurs obsolètes depuis le dernier passage
+            for message in suivi.messages():
+                yield message
             
             # Attendre un peu avant la prochaine vérification
-            import time
             time.sleep(5)
     
     return Response(event_stream(), mimetype="text/event-stream")
 
 if __name__ == '__main__':
-    # Démarrage du serveur RPC dans un thread séparé
-    thread_rpc = threading.Thread(target=demarrer_serveur_rpc, daemon=True)
-    thread_rpc.start()
+    # Démarrage des workers d'ingestion, du pipeline de commandes, du planificateur, de l'éviction et, en mode hub, de la fédération
+    file_ingestion.demarrer()
+    pipeline_commandes.demarrer()
+    planificateur.demarrer()
+    if hub:
+        hub.demarrer()
+    if gestionnaire_pieces.ttl and not hub:
+        # En mode hub, le retrait des pièces suit celui des sites (suppressions transmises par les deltas)
+        threading.Thread(target=evincer_pieces_en_continu, name="eviction", daemon=True).start()
     
-    # Démarrage du serveur Flask
-    logger.info("Démarrage du serveur Flask sur http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    if os.environ.get('CLIM_SERVEUR') == 'async':
+        # Mode production : REST, SSE et XML-RPC servis par une seule boucle asyncio
+        import serveur_async
+        serveur_async.lancer(app, RPCHandler(), gestionnaire_pieces, port_http=5000, port_rpc=8000)
+    else:
+        # Mode développement : serveur RPC dans un thread séparé et serveur Flask
+        thread_rpc = threading.Thread(target=demarrer_serveur_rpc, name="rpc", daemon=True)
+        thread_rpc.start()
+        
+        logger.info("Démarrage du serveur Flask sur http://0.0.0.0:5000")
+        app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
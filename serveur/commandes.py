@@ -0,0 +1,166 @@
+"""
+Module de pipeline des commandes de contrôle (température cible, climatisation, mode automatique).
+Les commandes reçues pendant une courte fenêtre sont regroupées en un lot ; au sein d'un lot,
+une commande remplace la précédente pour le même champ de la même pièce. Le lot est appliqué
+en une seule modification par pièce, et chaque émetteur est acquitté avec la valeur finale.
+"""
+import math
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _booleen(valeur) -> bool:
+    """Accepte uniquement un vrai booléen (JSON true/false)"""
+    if not isinstance(valeur, bool):
+        raise ValueError(f"Booléen attendu: {valeur!r}")
+    return valeur
+
+
+def _temperature(valeur) -> float:
+    """Convertit une température en nombre fini"""
+    if isinstance(valeur, bool):
+        raise ValueError(f"Température attendue: {valeur!r}")
+    temperature = float(valeur)
+    if not math.isfinite(temperature):
+        raise ValueError(f"Température non finie: {valeur!r}")
+    return temperature
+
+
+# Champs modifiables par commande et conversion (avec validation) de leur valeur
+CHAMPS_COMMANDE = {
+    'temperature_cible': _temperature,
+    'climatisation_active': _booleen,
+    'mode_automatique': _booleen,
+}
+
+
+class _Lot:
+    """Commandes fusionnées en attente d'application : {id_piece: {champ: valeur}}"""
+
+    def __init__(self, echeance: float):
+        self.echeance = echeance
+        self.commandes: Dict[str, Dict[str, object]] = {}
+        self.resultats: Dict[str, Optional[Dict]] = {}
+        self.erreur: Optional[Exception] = None
+        self.termine = threading.Event()
+
+
+class PipelineCommandes:
+    """Classe regroupant, fusionnant et appliquant par lots les commandes de contrôle"""
+
+    def __init__(self, appliquer_lot: Callable[[Dict[str, Dict[str, object]]], Dict[str, Optional[Dict]]],
+                 fenetre: float = 0.05, delai_max: float = 5.0):
+        self.appliquer_lot = appliquer_lot
+        self.fenetre = fenetre
+        self.delai_max = delai_max
+        self._lot: Optional[_Lot] = None
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._actif = False
+        self._stats: Dict[str, int] = {
+            'recues': 0,
+            'fusionnees': 0,
+            'lots': 0,
+            'erreurs': 0,
+        }
+
+    def demarrer(self) -> None:
+        """Démarre le thread d'application des lots"""
+        if self._actif:
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._executer, name="commandes", daemon=True)
+        self._thread.start()
+        logger.info(f"Pipeline de commandes démarré (fenêtre: {self.fenetre} s)")
+
+    def arreter(self) -> None:
+        """Arrête le thread après application du lot en attente"""
+        with self._condition:
+            self._actif = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def soumettre(self, commandes: Iterable[Tuple[str, str, object]]) -> _Lot:
+        """
+        Ajoute des commandes (id_piece, champ, valeur) au lot en cours et retourne ce lot.
+        Une commande remplaçant une commande en attente est replacée en fin d'ordre d'application.
+        """
+        # Validation complète avant fusion : un lot ne reçoit jamais une partie seulement des commandes
+        converties = []
+        for id_piece, champ, valeur in commandes:
+            if champ not in CHAMPS_COMMANDE:
+                raise ValueError(f"Champ de commande inconnu: {champ}")
+            try:
+                converties.append((id_piece, champ, CHAMPS_COMMANDE[champ](valeur)))
+            except (TypeError, ValueError):
+                raise ValueError(f"Valeur invalide pour {champ}: {valeur!r}")
+
+        with self._condition:
+            lot = self._lot
+            if lot is None:
+                lot = self._lot = _Lot(time.time() + self.fenetre)
+                self._condition.notify()
+            for id_piece, champ, valeur in converties:
+                champs = lot.commandes.setdefault(id_piece, {})
+                if champ in champs:
+                    del champs[champ]
+                    self._stats['fusionnees'] += 1
+                champs[champ] = valeur
+            self._stats['recues'] += len(converties)
+            return lot
+
+    def executer(self, commandes: List[Tuple[str, str, object]]) -> Dict[str, Optional[Dict]]:
+        """
+        Soumet des commandes et attend l'application de leur lot.
+        Retourne, pour chaque pièce concernée, les valeurs finales des champs commandés
+        (None si la pièce est introuvable).
+        """
+        lot = self.soumettre(commandes)
+        if not lot.termine.wait(self.delai_max):
+            raise TimeoutError("Lot de commandes non appliqué dans le délai imparti")
+        if lot.erreur is not None:
+            raise lot.erreur
+        return {id_piece: lot.resultats.get(id_piece) for id_piece, _, _ in commandes}
+
+    def _executer(self) -> None:
+        """Boucle du thread : attend la fin de la fenêtre du lot en cours puis l'applique"""
+        while True:
+            with self._condition:
+                while self._actif:
+                    attente = self._lot.echeance - time.time() if self._lot else None
+                    if attente is not None and attente <= 0:
+                        break
+                    self._condition.wait(attente)
+                lot, self._lot = self._lot, None
+                actif = self._actif
+
+            if lot is not None:
+                self._appliquer(lot)
+            if not actif:
+                return
+
+    def _appliquer(self, lot: _Lot) -> None:
+        """Applique un lot et réveille les émetteurs en attente"""
+        try:
+            lot.resultats = self.appliquer_lot(lot.commandes)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'application des commandes: {e}")
+            lot.erreur = e
+            with self._condition:
+                self._stats['erreurs'] += 1
+        with self._condition:
+            self._stats['lots'] += 1
+        lot.termine.set()
+
+    def obtenir_statistiques(self) -> Dict:
+        """Retourne les compteurs de commandes reçues, fusionnées et de lots appliqués"""
+        with self._condition:
+            stats = dict(self._stats)
+        stats['fenetre'] = self.fenetre
+        return stats
@@ -0,0 +1,78 @@
+"""
+Module de compression des réponses HTTP du serveur Flask.
+Négocie gzip ou deflate selon l'en-tête Accept-Encoding du client et ne compresse
+que les réponses textuelles suffisamment volumineuses (JSON, HTML, CSS, JavaScript).
+"""
+import gzip
+import zlib
+from typing import Dict
+
+# Taille minimale (en octets) à partir de laquelle une réponse est compressée
+TAILLE_MINIMALE = 1024
+NIVEAU_COMPRESSION = 6
+
+TYPES_COMPRESSIBLES = (
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'text/plain',
+)
+
+
+def _analyser_accept_encoding(entete: str) -> Dict[str, float]:
+    """Analyse l'en-tête Accept-Encoding en un dictionnaire {encodage: qualité}"""
+    encodages = {}
+    for element in entete.split(','):
+        parties = element.strip().split(';')
+        nom = parties[0].strip().lower()
+        if not nom:
+            continue
+        qualite = 1.0
+        for parametre in parties[1:]:
+            cle, _, valeur = parametre.strip().partition('=')
+            if cle == 'q':
+                try:
+                    qualite = float(valeur)
+                except ValueError:
+                    qualite = 0.0
+        encodages[nom] = qualite
+    return encodages
+
+
+def choisir_encodage(entete: str) -> str:
+    """Retourne 'gzip', 'deflate' ou '' selon les préférences du client"""
+    encodages = _analyser_accept_encoding(entete or '')
+    joker = encodages.get('*', 0.0)
+    candidats = [(encodages.get(nom, joker), nom) for nom in ('gzip', 'deflate')]
+    qualite, nom = max(candidats, key=lambda candidat: candidat[0])
+    return nom if qualite > 0 else ''
+
+
+def compresser_reponse(request, response):
+    """Compresse la réponse si le client l'accepte (à utiliser dans un after_request)"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in TYPES_COMPRESSIBLES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encodage = choisir_encodage(request.headers.get('Accept-Encoding', ''))
+    if not encodage:
+        return response
+
+    donnees = response.get_data()
+    if len(donnees) < TAILLE_MINIMALE:
+        return response
+
+    if encodage == 'gzip':
+        compressees = gzip.compress(donnees, compresslevel=NIVEAU_COMPRESSION)
+    else:
+        compressees = zlib.compress(donnees, NIVEAU_COMPRESSION)
+
+    response.set_data(compressees)
+    response.headers['Content-Encoding'] = encodage
+    response.headers['Content-Length'] = str(len(compressees))
+    return response
@@ -0,0 +1,207 @@
+"""
+Module de comptabilisation du temps de fonctionnement de la climatisation.
+Chaque transition marche/arrêt met à jour, en temps constant, des compteurs par tranches
+horaires et journalières (anneaux de taille fixe) ainsi que des classements de l'heure et
+du jour en cours, ce qui permet de répondre aux requêtes sans parcourir l'historique.
+Les tranches sont alignées sur l'UTC.
+"""
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional
+
+DUREE_HEURE = 3600
+DUREE_JOUR = 24 * 3600
+NB_HEURES_CONSERVEES = 48
+NB_JOURS_CONSERVES = 31
+
+
+def _chevauchement(debut: float, fin: float, tranche_debut: float, tranche_fin: float) -> float:
+    """Retourne la durée commune aux intervalles [debut, fin] et [tranche_debut, tranche_fin]"""
+    return max(0.0, min(fin, tranche_fin) - max(debut, tranche_debut))
+
+
+class _Anneau:
+    """Compteurs (secondes de marche, commutations) par tranche de durée fixe, conservés en anneau"""
+    __slots__ = ('duree', 'taille', 'tranches', 'secondes', 'commutations')
+
+    def __init__(self, duree: int, taille: int):
+        self.duree = duree
+        self.taille = taille
+        self.tranches = [-1] * taille
+        self.secondes = [0.0] * taille
+        self.commutations = [0] * taille
+
+    def _case(self, tranche: int) -> int:
+        """Retourne l'indice de la tranche, en recyclant la case si elle contient une tranche ancienne"""
+        indice = tranche % self.taille
+        if self.tranches[indice] != tranche:
+            self.tranches[indice] = tranche
+            self.secondes[indice] = 0.0
+            self.commutations[indice] = 0
+        return indice
+
+    def ajouter_duree(self, debut: float, fin: float) -> None:
+        """Répartit une période de marche sur les tranches qu'elle couvre (au plus `taille` tranches)"""
+        tranche = max(int(debut // self.duree), int(fin // self.duree) - self.taille + 1)
+        while tranche * self.duree < fin:
+            self.secondes[self._case(tranche)] += _chevauchement(
+                debut, fin, tranche * self.duree, (tranche + 1) * self.duree)
+            tranche += 1
+
+    def compter_commutation(self, instant: float) -> None:
+        """Compte une commutation dans la tranche contenant l'instant"""
+        self.commutations[self._case(int(instant // self.duree))] += 1
+
+    def lire(self, maintenant: float, nombre: int, en_marche_depuis: Optional[float]) -> List[Dict]:
+        """Retourne les `nombre` dernières tranches (de la plus ancienne à la courante), marche en cours incluse"""
+        courante = int(maintenant // self.duree)
+        resultat = []
+        for tranche in range(courante - min(nombre, self.taille) + 1, courante + 1):
+            indice = tranche % self.taille
+            secondes, commutations = 0.0, 0
+            if self.tranches[indice] == tranche:
+                secondes, commutations = self.secondes[indice], self.commutations[indice]
+            if en_marche_depuis is not None:
+                secondes += _chevauchement(en_marche_depuis, maintenant,
+                                           tranche * self.duree, (tranche + 1) * self.duree)
+            resultat.append({'debut': tranche * self.duree, 'secondes': round(secondes, 1),
+                             'commutations': commutations})
+        return resultat
+
+
+class _Accumulateur:
+    """État de marche et compteurs d'une pièce"""
+    __slots__ = ('en_marche_depuis', 'heures', 'jours', 'total_secondes', 'total_commutations')
+
+    def __init__(self):
+        self.en_marche_depuis: Optional[float] = None
+        self.heures = _Anneau(DUREE_HEURE, NB_HEURES_CONSERVEES)
+        self.jours = _Anneau(DUREE_JOUR, NB_JOURS_CONSERVES)
+        self.total_secondes = 0.0
+        self.total_commutations = 0
+
+
+class _ClassementPeriode:
+    """Temps de marche cumulé par pièce sur la période (heure ou jour) en cours"""
+
+    def __init__(self, duree: int):
+        self.duree = duree
+        self.periode = -1
+        self.secondes: Dict[str, float] = {}
+
+    def ajouter(self, id_piece: str, debut: float, fin: float) -> None:
+        """Ajoute la part d'une période de marche tombant dans la période en cours"""
+        periode = int(fin // self.duree)
+        if periode != self.periode:
+            self.periode = periode
+            self.secondes = {}
+        duree = _chevauchement(debut, fin, periode * self.duree, (periode + 1) * self.duree)
+        if duree > 0:
+            self.secondes[id_piece] = self.secondes.get(id_piece, 0.0) + duree
+
+    def meilleurs(self, nombre: int, maintenant: float, en_marche: Dict[str, float]) -> List[Dict]:
+        """Retourne les `nombre` pièces ayant le plus fonctionné sur la période en cours"""
+        periode = int(maintenant // self.duree)
+        debut_periode = periode * self.duree
+        totaux = dict(self.secondes) if periode == self.periode else {}
+        for id_piece, depuis in en_marche.items():
+            totaux[id_piece] = totaux.get(id_piece, 0.0) + _chevauchement(
+                depuis, maintenant, debut_periode, maintenant)
+        meilleurs = heapq.nlargest(nombre, totaux.items(), key=lambda element: element[1])
+        return [{'piece_id': id_piece, 'secondes': round(secondes, 1)} for id_piece, secondes in meilleurs]
+
+
+class CompteurConsommation:
+    """Classe comptabilisant le temps de marche et les commutations de la climatisation"""
+
+    PERIODES = {'heure': DUREE_HEURE, 'jour': DUREE_JOUR}
+
+    def __init__(self):
+        self._accumulateurs: Dict[str, _Accumulateur] = {}
+        self._en_marche: Dict[str, float] = {}  # Pièces dont la climatisation tourne : {id_piece: depuis}
+        self._classements = {periode: _ClassementPeriode(duree) for periode, duree in self.PERIODES.items()}
+        self._verrou = threading.Lock()
+
+    def enregistrer_transition(self, id_piece: str, active: bool, instant: Optional[float] = None) -> None:
+        """Enregistre la mise en marche ou l'arrêt de la climatisation d'une pièce (O(1))"""
+        if instant is None:
+            instant = time.time()
+        with self._verrou:
+            accumulateur = self._accumulateurs.get(id_piece)
+            if accumulateur is None:
+                accumulateur = self._accumulateurs[id_piece] = _Accumulateur()
+            if active == (accumulateur.en_marche_depuis is not None):
+                return
+
+            accumulateur.heures.compter_commutation(instant)
+            accumulateur.jours.compter_commutation(instant)
+            accumulateur.total_commutations += 1
+
+            if active:
+                accumulateur.en_marche_depuis = instant
+                self._en_marche[id_piece] = instant
+                return
+
+            debut = accumulateur.en_marche_depuis
+            accumulateur.en_marche_depuis = None
+            del self._en_marche[id_piece]
+            accumulateur.heures.ajouter_duree(debut, instant)
+            accumulateur.jours.ajouter_duree(debut, instant)
+            accumulateur.total_secondes += instant - debut
+            for classement in self._classements.values():
+                classement.ajouter(id_piece, debut, instant)
+
+    def oublier_piece(self, id_piece: str) -> None:
+        """Supprime l'historique de consommation d'une pièce (pièce supprimée)"""
+        with self._verrou:
+            self._accumulateurs.pop(id_piece, None)
+            self._en_marche.pop(id_piece, None)
+            for classement in self._classements.values():
+                classement.secondes.pop(id_piece, None)
+
+    def obtenir_consommation(self, id_piece: str, nb_heures: int = 24, nb_jours: int = 7,
+                             maintenant: Optional[float] = None) -> Dict:
+        """Retourne le temps de marche par heure et par jour d'une pièce (tranches à zéro si jamais commutée)"""
+        if maintenant is None:
+            maintenant = time.time()
+        with self._verrou:
+            accumulateur = self._accumulateurs.get(id_piece) or _Accumulateur()
+            depuis = accumulateur.en_marche_depuis
+            en_cours = maintenant - depuis if depuis is not None else 0.0
+            return {
+                'piece_id': id_piece,
+                'climatisation_active': depuis is not None,
+                'en_marche_depuis': depuis,
+                'total_secondes': round(accumulateur.total_secondes + en_cours, 1),
+                'total_commutations': accumulateur.total_commutations,
+                'heures': accumulateur.heures.lire(maintenant, nb_heures, depuis),
+                'jours': accumulateur.jours.lire(maintenant, nb_jours, depuis),
+            }
+
+    def obtenir_consommation_zone(self, pieces: List[str], nb_heures: int = 24, nb_jours: int = 7) -> Dict:
+        """Additionne la consommation des pièces d'une zone, tranche par tranche"""
+        maintenant = time.time()
+        zone = {'pieces': list(pieces), 'total_secondes': 0.0, 'total_commutations': 0,
+                'pieces_actives': 0, 'heures': None, 'jours': None}
+        for id_piece in pieces:
+            consommation = self.obtenir_consommation(id_piece, nb_heures, nb_jours, maintenant)
+            zone['total_secondes'] += consommation['total_secondes']
+            zone['total_commutations'] += consommation['total_commutations']
+            zone['pieces_actives'] += consommation['climatisation_active']
+            for granularite in ('heures', 'jours'):
+                if zone[granularite] is None:
+                    zone[granularite] = consommation[granularite]
+                    continue
+                for cumul, tranche in zip(zone[granularite], consommation[granularite]):
+                    cumul['secondes'] = round(cumul['secondes'] + tranche['secondes'], 1)
+                    cumul['commutations'] += tranche['commutations']
+        zone['total_secondes'] = round(zone['total_secondes'], 1)
+        return zone
+
+    def obtenir_classement(self, nombre: int = 10, periode: str = 'jour') -> List[Dict]:
+        """Retourne les pièces ayant le plus fonctionné sur l'heure ou le jour en cours"""
+        if periode not in self._classements:
+            raise ValueError(f"Période inconnue: {periode} (attendu: {', '.join(self.PERIODES)})")
+        with self._verrou:
+            return self._classements[periode].meilleurs(nombre, time.time(), self._en_marche)
@@ -0,0 +1,179 @@
+"""
+Module de détection d'anomalies en flux pour les données des capteurs.
+Maintient pour chaque capteur des statistiques glissantes (moyenne et variance EWMA,
+vitesse de variation, série de valeurs identiques) mises à jour en temps et mémoire
+constants à chaque mesure, quelle que soit la durée de fonctionnement du capteur.
+"""
+import threading
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SeuilsCapteur:
+    """Seuils de détection propres à un type de capteur"""
+    vitesse_max: float  # Variation maximale réaliste, en unité par seconde
+    derive_max: float  # Écart maximal toléré entre moyenne rapide et moyenne lente
+    ecart_type_min: float  # Plancher de l'écart-type pour le calcul du score z
+
+
+# Seuils par défaut, cohérents avec les plages des simulateurs
+# (15-30 °C, 20-80 %, 975-1040 hPa)
+SEUILS_PAR_DEFAUT: Dict[str, SeuilsCapteur] = {
+    'temperature': SeuilsCapteur(vitesse_max=0.5, derive_max=5.0, ecart_type_min=0.2),
+    'humidite': SeuilsCapteur(vitesse_max=0.5, derive_max=15.0, ecart_type_min=1.0),
+    'pression': SeuilsCapteur(vitesse_max=0.5, derive_max=10.0, ecart_type_min=0.5),
+}
+
+
+@dataclass
+class Anomalie:
+    """Classe représentant une anomalie détectée sur un capteur"""
+    sequence: int
+    id_piece: str
+    type_capteur: str
+    type_anomalie: str  # 'valeur_aberrante', 'saut', 'capteur_bloque' ou 'derive'
+    valeur: float
+    timestamp: float
+    details: str = ""
+
+
+class _EtatCapteur:
+    """Statistiques glissantes d'un capteur (taille fixe)"""
+    __slots__ = ('nombre', 'moyenne', 'variance', 'moyenne_lente',
+                 'derniere_valeur', 'dernier_timestamp', 'repetitions', 'en_derive')
+
+    def __init__(self, valeur: float, timestamp: float):
+        self.nombre = 1
+        self.moyenne = valeur
+        self.variance = 0.0
+        self.moyenne_lente = valeur
+        self.derniere_valeur = valeur
+        self.dernier_timestamp = timestamp
+        self.repetitions = 1
+        self.en_derive = False
+
+
+class DetecteurAnomalies:
+    """Classe pour détecter en flux les valeurs aberrantes, sauts, capteurs bloqués et dérives"""
+
+    def __init__(self, alpha: float = 0.1, alpha_lent: float = 0.01, seuil_z: float = 4.0,
+                 repetitions_max: int = 20, echauffement: int = 10, historique_max: int = 500,
+                 seuils: Optional[Dict[str, SeuilsCapteur]] = None):
+        self.alpha = alpha
+        self.alpha_lent = alpha_lent
+        self.seuil_z = seuil_z
+        self.repetitions_max = repetitions_max
+        self.echauffement = echauffement
+        self.seuils = seuils if seuils is not None else SEUILS_PAR_DEFAUT
+        self._etats: Dict[Tuple[str, str], _EtatCapteur] = {}
+        self._anomalies: Deque[Anomalie] = deque(maxlen=historique_max)
+        self._sequence = 0
+        self._verrou = threading.Lock()
+
+    def analyser(self, id_piece: str, type_capteur: str, valeur: float, timestamp: float) -> List[Anomalie]:
+        """Met à jour les statistiques du capteur et retourne les anomalies détectées pour cette mesure"""
+        seuils = self.seuils.get(type_capteur)
+        if seuils is None:
+            return []
+
+        cle = (id_piece, type_capteur)
+        with self._verrou:
+            etat = self._etats.get(cle)
+            if etat is None:
+                self._etats[cle] = _EtatCapteur(valeur, timestamp)
+                return []
+
+            detectees = []
+
+            # Score z calculé par rapport aux statistiques précédant la mesure
+            if etat.nombre >= self.echauffement:
+                ecart_type = max(etat.variance ** 0.5, seuils.ecart_type_min)
+                score_z = abs(valeur - etat.moyenne) / ecart_type
+                if score_z > self.seuil_z:
+                    detectees.append(self._signaler(
+                        id_piece, type_capteur, 'valeur_aberrante', valeur, timestamp,
+                        f"score z {score_z:.1f} (moyenne {etat.moyenne:.2f})"))
+
+            # Vitesse de variation depuis la mesure précédente
+            duree = timestamp - etat.dernier_timestamp
+            if duree > 0:
+                vitesse = abs(valeur - etat.derniere_valeur) / duree
+                if vitesse > seuils.vitesse_max:
+                    detectees.append(self._signaler(
+                        id_piece, type_capteur, 'saut', valeur, timestamp,
+                        f"variation de {valeur - etat.derniere_valeur:+.2f} en {duree:.1f} s"))
+
+            # Série de valeurs identiques (signalée une seule fois par série)
+            if valeur == etat.derniere_valeur:
+                etat.repetitions += 1
+                if etat.repetitions == self.repetitions_max:
+                    detectees.append(self._signaler(
+                        id_piece, type_capteur, 'capteur_bloque', valeur, timestamp,
+                        f"{etat.repetitions} valeurs identiques consécutives"))
+            else:
+                etat.repetitions = 1
+
+            # Mise à jour des moyennes et de la variance exponentielles
+            difference = valeur - etat.moyenne
+            etat.moyenne += self.alpha * difference
+            etat.variance = (1 - self.alpha) * (etat.variance + self.alpha * difference * difference)
+            etat.moyenne_lente += self.alpha_lent * (valeur - etat.moyenne_lente)
+            etat.nombre += 1
+            etat.derniere_valeur = valeur
+            etat.dernier_timestamp = timestamp
+
+            # Dérive : la moyenne rapide s'éloigne durablement de la moyenne lente
+            ecart = etat.moyenne - etat.moyenne_lente
+            if etat.nombre >= self.echauffement and abs(ecart) > seuils.derive_max:
+                if not etat.en_derive:
+                    etat.en_derive = True
+                    detectees.append(self._signaler(
+                        id_piece, type_capteur, 'derive', valeur, timestamp,
+                        f"écart de {ecart:+.2f} avec la moyenne long terme"))
+            elif abs(ecart) < seuils.derive_max / 2:
+                etat.en_derive = False
+
+        for anomalie in detectees:
+            logger.warning(f"Anomalie {anomalie.type_anomalie} - Pièce: {id_piece}, "
+                           f"Capteur: {type_capteur}, Valeur: {valeur} ({anomalie.details})")
+        return detectees
+
+    def _signaler(self, id_piece: str, type_capteur: str, type_anomalie: str,
+                  valeur: float, timestamp: float, details: str) -> Anomalie:
+        """Enregistre une anomalie dans l'historique borné (appelé sous verrou)"""
+        self._sequence += 1
+        anomalie = Anomalie(self._sequence, id_piece, type_capteur, type_anomalie, valeur, timestamp, details)
+        self._anomalies.append(anomalie)
+        return anomalie
+
+    def oublier_piece(self, id_piece: str) -> None:
+        """Oublie les statistiques des capteurs d'une pièce (pièce évincée ou supprimée)"""
+        with self._verrou:
+            for type_capteur in self.seuils:
+                self._etats.pop((id_piece, type_capteur), None)
+
+    def derniere_sequence(self) -> int:
+        """Retourne le numéro de séquence de la dernière anomalie détectée"""
+        return self._sequence
+
+    def obtenir_anomalies(self, depuis: int = 0, limite: Optional[int] = None) -> List[Dict]:
+        """
+        Retourne les anomalies de séquence supérieure à `depuis`, de la plus ancienne à la plus récente,
+        limitées aux `limite` plus anciennes : la dernière séquence retournée sert de `depuis` suivant.
+        """
+        nouvelles = []
+        with self._verrou:
+            # Parcours depuis la fin : le coût dépend du nombre de nouvelles anomalies
+            for anomalie in reversed(self._anomalies):
+                if anomalie.sequence <= depuis:
+                    break
+                nouvelles.append(anomalie)
+        nouvelles.reverse()
+        if limite is not None:
+            nouvelles = nouvelles[:limite]
+        return [asdict(anomalie) for anomalie in nouvelles]
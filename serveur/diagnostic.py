@@ -0,0 +1,183 @@
+"""
+Module de diagnostic à chaud du serveur central.
+Fournit un profileur par échantillonnage (piles de tous les threads relevées périodiquement),
+des différences d'instantanés tracemalloc et le temps CPU par thread, étiqueté par rôle
+(RPC, Flask, SSE, simulateur...). Rien ne s'exécute tant qu'aucun diagnostic n'est demandé.
+"""
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Rôles déduits du nom des threads, lorsqu'aucune étiquette explicite n'a été posée
+ROLES_PAR_PREFIXE = (
+    ('rpc', 'rpc'),
+    ('ingestion-', 'ingestion'),
+    ('planification', 'planification'),
+    ('commandes', 'commandes'),
+    ('federation-', 'federation'),
+    ('eviction', 'eviction'),
+    ('simulateur-', 'simulateur'),
+    ('flask-async', 'flask'),  # Pool du serveur asynchrone ; les appels XML-RPC y sont étiquetés 'rpc'
+    ('MainThread', 'flask'),
+)
+ROLE_PAR_DEFAUT = 'flask'  # Threads de requête du serveur de développement Flask
+
+_etiquettes: Dict[int, str] = {}
+
+
+def etiqueter_thread(role: str) -> None:
+    """Associe un rôle au thread courant (ex: 'sse' pour une connexion de streaming)"""
+    _etiquettes[threading.get_ident()] = role
+
+
+def retirer_etiquette_thread() -> None:
+    """Retire l'étiquette du thread courant"""
+    _etiquettes.pop(threading.get_ident(), None)
+
+
+def role_thread(thread: threading.Thread) -> str:
+    """Retourne le rôle d'un thread : étiquette explicite, sinon déduit de son nom"""
+    role = _etiquettes.get(thread.ident)
+    if role:
+        return role
+    for prefixe, role in ROLES_PAR_PREFIXE:
+        if thread.name.startswith(prefixe):
+            return role
+    return ROLE_PAR_DEFAUT
+
+
+def _temps_cpu_thread(ident: int) -> Optional[float]:
+    """Retourne le temps CPU consommé par un thread, si la plateforme le permet"""
+    if not hasattr(time, 'pthread_getcpuclockid'):
+        return None
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (OSError, OverflowError):
+        return None
+
+
+def obtenir_temps_cpu_threads() -> Dict:
+    """Retourne le temps CPU par thread et agrégé par rôle"""
+    threads = []
+    par_role: Dict[str, float] = {}
+    for thread in threading.enumerate():
+        temps = _temps_cpu_thread(thread.ident)
+        role = role_thread(thread)
+        threads.append({'nom': thread.name, 'role': role, 'temps_cpu': temps})
+        if temps is not None:
+            par_role[role] = par_role.get(role, 0.0) + temps
+    threads.sort(key=lambda t: t['temps_cpu'] or 0.0, reverse=True)
+    return {'threads': threads, 'par_role': par_role, 'processus': time.process_time()}
+
+
+class ProfileurEchantillonnage:
+    """Profileur relevant périodiquement les piles de tous les threads pendant une durée donnée"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+
+    def profiler(self, duree: float, intervalle: float = 0.005, nb_piles: int = 30) -> Dict:
+        """
+        Échantillonne les piles pendant `duree` secondes et retourne les piles les plus fréquentes
+        (format « replié » role;fichier:fonction:ligne;...) et les fonctions les plus actives.
+        Lève RuntimeError si un profilage est déjà en cours.
+        """
+        if not self._verrou.acquire(blocking=False):
+            raise RuntimeError("Un profilage est déjà en cours")
+        try:
+            return self._echantillonner(duree, intervalle, nb_piles)
+        finally:
+            self._verrou.release()
+
+    def _echantillonner(self, duree: float, intervalle: float, nb_piles: int) -> Dict:
+        """Boucle d'échantillonnage exécutée dans le thread appelant"""
+        piles: Counter = Counter()
+        fonctions: Counter = Counter()
+        echantillons = 0
+        moi = threading.get_ident()
+        fin = time.monotonic() + duree
+
+        while time.monotonic() < fin:
+            roles = {thread.ident: role_thread(thread) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == moi:
+                    continue
+                pile = []
+                while frame is not None:
+                    code = frame.f_code
+                    pile.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if not pile:
+                    continue
+                fonctions[pile[0]] += 1
+                pile.append(roles.get(ident, ROLE_PAR_DEFAUT))
+                piles[';'.join(reversed(pile))] += 1
+            echantillons += 1
+            time.sleep(intervalle)
+
+        return {
+            'duree': duree,
+            'echantillons': echantillons,
+            'piles': [{'pile': pile, 'echantillons': nombre} for pile, nombre in piles.most_common(nb_piles)],
+            'fonctions': [{'fonction': fonction, 'echantillons': nombre}
+                          for fonction, nombre in fonctions.most_common(nb_piles)],
+        }
+
+
+class TraceurAllocations:
+    """Classe encapsulant tracemalloc : démarrage, instantané de référence et différences"""
+
+    def __init__(self):
+        self._reference: Optional[tracemalloc.Snapshot] = None
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _instantane() -> tracemalloc.Snapshot:
+        """Prend un instantané en excluant les allocations propres à tracemalloc et à l'import"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def demarrer(self, nb_frames: int = 10) -> None:
+        """Démarre le traçage des allocations et prend un instantané de référence"""
+        with self._verrou:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(nb_frames)
+            self._reference = self._instantane()
+
+    def arreter(self) -> None:
+        """Arrête le traçage des allocations (supprime son surcoût)"""
+        with self._verrou:
+            self._reference = None
+            tracemalloc.stop()
+
+    def difference(self, nb_sites: int = 25, mettre_a_jour: bool = False) -> Dict:
+        """
+        Compare un nouvel instantané à la référence et retourne les principaux sites d'allocation.
+        Lève RuntimeError si le traçage n'est pas démarré.
+        """
+        with self._verrou:
+            if not tracemalloc.is_tracing() or self._reference is None:
+                raise RuntimeError("Le traçage des allocations n'est pas démarré")
+            instantane = self._instantane()
+            ecarts = instantane.compare_to(self._reference, 'lineno')
+            if mettre_a_jour:
+                self._reference = instantane
+            actuel, pic = tracemalloc.get_traced_memory()
+
+        sites: List[Dict] = []
+        for ecart in ecarts[:nb_sites]:
+            frame = ecart.traceback[0]
+            sites.append({
+                'site': f"{frame.filename}:{frame.lineno}",
+                'taille': ecart.size,
+                'ecart_taille': ecart.size_diff,
+                'nombre': ecart.count,
+                'ecart_nombre': ecart.count_diff,
+            })
+        return {'memoire_tracee': actuel, 'pic': pic, 'sites': sites}
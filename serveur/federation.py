@@ -0,0 +1,188 @@
+"""
+Module de fédération multi-sites (mode hub).
+Le hub s'abonne à plusieurs serveurs de bâtiment, ne récupère que les pièces modifiées
+depuis son dernier curseur (/api/pieces/changements) et les fusionne dans une vue globale
+dont les identifiants sont préfixés par le site (« site/piece »). Les commandes adressées
+à une pièce fédérée sont relayées au serveur propriétaire.
+"""
+import gzip
+import json
+import threading
+import time
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEPARATEUR_SITE = '/'
+
+
+def analyser_sites(configuration: str) -> Dict[str, str]:
+    """Analyse une configuration « nom=url,nom=url » en dictionnaire {nom: url}"""
+    sites = {}
+    for element in configuration.split(','):
+        if not element.strip():
+            continue
+        nom, separateur, url = element.partition('=')
+        if not separateur or not nom.strip() or not url.strip():
+            raise ValueError(f"Site invalide (attendu nom=url): {element}")
+        if SEPARATEUR_SITE in nom:
+            raise ValueError(f"Le nom de site ne doit pas contenir '{SEPARATEUR_SITE}': {nom}")
+        sites[nom.strip()] = url.strip().rstrip('/')
+    return sites
+
+
+class _EtatSite:
+    """Curseur de synchronisation et état de connexion d'un serveur en aval"""
+
+    def __init__(self, nom: str, url: str):
+        self.nom = nom
+        self.url = url
+        self.instance: Optional[str] = None
+        self.curseur = 0
+        self.derniere_synchro: Optional[float] = None
+        self.pieces_recues = 0
+        self.erreurs = 0
+        self.derniere_erreur: Optional[str] = None
+        self.verrou = threading.Lock()
+
+
+class HubFederation:
+    """Classe synchronisant plusieurs serveurs de bâtiment dans le gestionnaire de pièces local"""
+
+    def __init__(self, gestionnaire_pieces, sites: Dict[str, str], intervalle: float = 2.0, delai: float = 10.0):
+        self.gestionnaire_pieces = gestionnaire_pieces
+        self.intervalle = intervalle
+        self.delai = delai
+        self._sites = {nom: _EtatSite(nom, url) for nom, url in sites.items()}
+        self._threads = []
+        self._actif = threading.Event()
+
+    def demarrer(self) -> None:
+        """Démarre un thread de synchronisation par site"""
+        if self._actif.is_set():
+            return
+        self._actif.set()
+        for site in self._sites.values():
+            thread = threading.Thread(target=self._synchroniser_en_continu, args=(site,),
+                                      name=f"federation-{site.nom}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Hub de fédération démarré ({len(self._sites)} sites)")
+
+    def arreter(self) -> None:
+        """Arrête les threads de synchronisation"""
+        self._actif.clear()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _requete(self, url: str, donnees: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """Effectue une requête HTTP (GET, ou POST JSON si `donnees`) et retourne (statut, corps JSON)"""
+        entetes = {'Accept-Encoding': 'gzip', 'Accept': 'application/json'}
+        corps = None
+        if donnees is not None:
+            corps = json.dumps(donnees).encode('utf-8')
+            entetes['Content-Type'] = 'application/json'
+        requete = urllib.request.Request(url, data=corps, headers=entetes)
+        try:
+            with urllib.request.urlopen(requete, timeout=self.delai) as reponse:
+                statut, contenu, encodage = reponse.status, reponse.read(), reponse.headers.get('Content-Encoding')
+        except urllib.error.HTTPError as e:
+            statut, contenu, encodage = e.code, e.read(), e.headers.get('Content-Encoding')
+        if encodage == 'gzip':
+            contenu = gzip.decompress(contenu)
+        return statut, json.loads(contenu) if contenu else {}
+
+    def synchroniser(self, site: _EtatSite) -> int:
+        """Récupère les pièces modifiées (et retirées) depuis le curseur du site et les fusionne ; retourne leur nombre"""
+        with site.verrou:
+            return self._synchroniser(site)
+
+    def _synchroniser(self, site: _EtatSite) -> int:
+        """Synchronisation d'un site (appelé sous le verrou du site)"""
+        statut, reponse = self._requete(f"{site.url}/api/pieces/changements?depuis={site.curseur}")
+        if statut != 200:
+            raise RuntimeError(f"Réponse HTTP {statut}")
+
+        # Un serveur redémarré repart de la version 0 : resynchronisation complète
+        if reponse.get('instance') != site.instance and site.curseur:
+            logger.info(f"Site {site.nom} redémarré, resynchronisation complète")
+            site.instance = None
+            site.curseur = 0
+            return self._synchroniser(site)
+
+        prefixe = f"{site.nom}{SEPARATEUR_SITE}"
+        pieces = {
+            f"{prefixe}{id_piece}": {**donnees, 'id': f"{prefixe}{id_piece}"}
+            for id_piece, donnees in reponse.get('pieces', {}).items()
+        }
+        supprimees = [f"{prefixe}{id_piece}" for id_piece in reponse.get('supprimees', [])]
+        if reponse.get('complet'):
+            # État complet : les pièces du site absentes de la réponse ont été retirées entre-temps
+            supprimees = [id_piece for id_piece in self.gestionnaire_pieces.obtenir_ids_pieces(prefixe)
+                          if id_piece not in pieces]
+        if pieces:
+            self.gestionnaire_pieces.fusionner_pieces_distantes(pieces)
+        for id_piece in supprimees:
+            self.gestionnaire_pieces.supprimer_piece(id_piece)
+        site.instance = reponse.get('instance')
+        site.curseur = reponse.get('version', site.curseur)
+        site.derniere_synchro = time.time()
+        site.pieces_recues += len(pieces)
+        return len(pieces)
+
+    def _synchroniser_en_continu(self, site: _EtatSite) -> None:
+        """Boucle de synchronisation d'un site"""
+        while self._actif.is_set():
+            try:
+                self.synchroniser(site)
+                site.derniere_erreur = None
+            except Exception as e:
+                site.erreurs += 1
+                site.derniere_erreur = str(e)
+                logger.warning(f"Synchronisation du site {site.nom} impossible: {e}")
+            time.sleep(self.intervalle)
+
+    def site_de(self, id_piece: str) -> Optional[Tuple[_EtatSite, str]]:
+        """Retourne (site, identifiant local) si la pièce appartient à un site fédéré, sinon None"""
+        nom, separateur, id_local = id_piece.partition(SEPARATEUR_SITE)
+        if not separateur or nom not in self._sites:
+            return None
+        return self._sites[nom], id_local
+
+    def relayer_commande(self, id_piece: str, commande: str, donnees: Dict) -> Tuple[int, Dict]:
+        """
+        Relaie une commande (ex: 'temperature-cible') au site propriétaire de la pièce
+        et retourne (statut HTTP, réponse) du site.
+        """
+        site, id_local = self.site_de(id_piece)
+        url = f"{site.url}/api/pieces/{urllib.parse.quote(id_local, safe='')}/{commande}"
+        try:
+            statut, reponse = self._requete(url, donnees)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return 502, {'erreur': f"Site {site.nom} injoignable: {e}"}
+        if statut == 200:
+            # Synchronisation immédiate pour que la vue globale reflète la commande
+            try:
+                self.synchroniser(site)
+            except Exception as e:
+                logger.warning(f"Synchronisation du site {site.nom} après commande impossible: {e}")
+        return statut, reponse
+
+    def obtenir_etat_sites(self) -> Dict:
+        """Retourne l'état de synchronisation de chaque site"""
+        return {
+            site.nom: {
+                'url': site.url,
+                'curseur': site.curseur,
+                'derniere_synchro': site.derniere_synchro,
+                'pieces_recues': site.pieces_recues,
+                'erreurs': site.erreurs,
+                'derniere_erreur': site.derniere_erreur,
+            }
+            for site in self._sites.values()
+        }
@@ -0,0 +1,159 @@
+"""
+Module de file d'ingestion bornée pour les données des capteurs.
+Découple l'acceptation d'une mesure (appel RPC) de son application dans le gestionnaire
+de pièces : les mesures sont mises en file, fusionnées par (pièce, capteur) lorsqu'une
+mesure plus récente remplace une mesure encore en attente, puis appliquées par lots
+par des workers. Lorsque la file est pleine, une politique explicite est appliquée.
+"""
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Politiques de délestage lorsque la file est pleine
+POLITIQUE_REJETER = 'rejeter'  # Refuser la nouvelle mesure avec un délai de nouvel essai
+POLITIQUE_EVINCER = 'evincer_plus_ancien'  # Abandonner la plus ancienne mesure en attente
+POLITIQUES = (POLITIQUE_REJETER, POLITIQUE_EVINCER)
+
+
+class Mesure(NamedTuple):
+    """Mesure d'un capteur en attente d'application"""
+    id_piece: str
+    type_capteur: str
+    valeur: float
+    unite: str
+    timestamp: float
+
+
+class _Partition:
+    """Sous-file servie par un seul worker, pour préserver l'ordre des mesures d'un même capteur"""
+
+    def __init__(self):
+        self.en_attente: "OrderedDict[Tuple[str, str], Mesure]" = OrderedDict()
+        self.condition = threading.Condition()
+
+
+class FileIngestion:
+    """Classe gérant la file bornée, les workers d'application et les statistiques de délestage"""
+
+    def __init__(self, appliquer_lot: Callable[[List[Mesure]], None], capacite: int = 10000,
+                 taille_lot: int = 256, nb_workers: int = 2, politique: str = POLITIQUE_REJETER,
+                 delai_reessai: float = 1.0):
+        if politique not in POLITIQUES:
+            raise ValueError(f"Politique de délestage inconnue: {politique}")
+        self.appliquer_lot = appliquer_lot
+        self.nb_workers = max(1, nb_workers)
+        self.capacite_partition = max(1, capacite // self.nb_workers)
+        self.taille_lot = taille_lot
+        self.politique = politique
+        self.delai_reessai = delai_reessai
+        self._partitions = [_Partition() for _ in range(self.nb_workers)]
+        self._workers: List[threading.Thread] = []
+        self._actif = False
+        self._verrou_stats = threading.Lock()
+        self._stats: Dict[str, int] = {
+            'acceptees': 0,
+            'fusionnees': 0,
+            'rejetees': 0,
+            'evincees': 0,
+            'appliquees': 0,
+            'lots': 0,
+            'erreurs': 0,
+        }
+
+    def demarrer(self) -> None:
+        """Démarre les workers d'application"""
+        if self._actif:
+            return
+        self._actif = True
+        for numero, partition in enumerate(self._partitions):
+            worker = threading.Thread(target=self._traiter, args=(partition,),
+                                      name=f"ingestion-{numero}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"File d'ingestion démarrée ({self.nb_workers} workers, politique: {self.politique})")
+
+    def arreter(self) -> None:
+        """Arrête les workers après application des mesures en attente"""
+        self._actif = False
+        for partition in self._partitions:
+            with partition.condition:
+                partition.condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def soumettre(self, id_piece: str, type_capteur: str, valeur: float, unite: str) -> bool:
+        """
+        Met une mesure en file. Retourne False si elle est refusée (file pleine avec la politique
+        'rejeter'), auquel cas l'émetteur doit réessayer après `delai_reessai` secondes.
+        """
+        cle = (id_piece, type_capteur)
+        mesure = Mesure(id_piece, type_capteur, valeur, unite, time.time())
+        partition = self._partitions[hash(cle) % self.nb_workers]
+        compteur = 'acceptees'
+
+        with partition.condition:
+            if cle in partition.en_attente:
+                # La mesure en attente est remplacée par la plus récente
+                partition.en_attente[cle] = mesure
+                compteur = 'fusionnees'
+            elif len(partition.en_attente) >= self.capacite_partition:
+                if self.politique == POLITIQUE_REJETER:
+                    compteur = 'rejetees'
+                else:
+                    partition.en_attente.popitem(last=False)
+                    partition.en_attente[cle] = mesure
+                    compteur = 'evincees'
+            else:
+                partition.en_attente[cle] = mesure
+            partition.condition.notify()
+
+        with self._verrou_stats:
+            self._stats[compteur] += 1
+        return compteur != 'rejetees'
+
+    def _traiter(self, partition: _Partition) -> None:
+        """Boucle d'un worker : extrait un lot de mesures et l'applique"""
+        while True:
+            with partition.condition:
+                while self._actif and not partition.en_attente:
+                    partition.condition.wait()
+                if not partition.en_attente:
+                    return
+                lot = []
+                while partition.en_attente and len(lot) < self.taille_lot:
+                    lot.append(partition.en_attente.popitem(last=False)[1])
+
+            try:
+                self.appliquer_lot(lot)
+                erreurs = 0
+            except Exception as e:
+                logger.error(f"Erreur lors de l'application d'un lot de {len(lot)} mesures: {e}")
+                erreurs = 1
+
+            with self._verrou_stats:
+                self._stats['lots'] += 1
+                self._stats['erreurs'] += erreurs
+                if not erreurs:
+                    self._stats['appliquees'] += len(lot)
+
+    def profondeur(self) -> int:
+        """Retourne le nombre de mesures en attente"""
+        return sum(len(partition.en_attente) for partition in self._partitions)
+
+    def obtenir_statistiques(self) -> Dict:
+        """Retourne la profondeur de la file et les compteurs d'acceptation et de délestage"""
+        with self._verrou_stats:
+            stats = dict(self._stats)
+        stats.update({
+            'profondeur': self.profondeur(),
+            'capacite': self.capacite_partition * self.nb_workers,
+            'workers': self.nb_workers,
+            'politique': self.politique,
+            'delai_reessai': self.delai_reessai,
+        })
+        return stats
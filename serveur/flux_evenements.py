@@ -0,0 +1,50 @@
+"""
+Module de construction des messages Server-Sent Events du flux /api/stream.
+Partagé par le serveur Flask (une instance par connexion) et le serveur asynchrone
+(une instance unique dont les messages sont diffusés à toutes les connexions).
+"""
+import json
+from typing import List, Optional
+
+
+class SuiviFluxEvenements:
+    """Classe produisant les messages SSE (état des pièces, anomalies, capteurs obsolètes) depuis le dernier appel"""
+
+    def __init__(self, gestionnaire_pieces):
+        self.gestionnaire_pieces = gestionnaire_pieces
+        self.derniere_version: Optional[int] = None
+        self.dernier_etat: Optional[str] = None
+        self.derniere_anomalie = gestionnaire_pieces.detecteur_anomalies.derniere_sequence()
+        self.dernier_obsolete = gestionnaire_pieces.index_obsolescence.derniere_sequence()
+
+    def messages(self) -> List[str]:
+        """Retourne les messages SSE à envoyer depuis le dernier appel"""
+        messages = []
+        gestionnaire = self.gestionnaire_pieces
+
+        # Reconstruction et comparaison uniquement si une pièce a été modifiée
+        if gestionnaire.version != self.derniere_version:
+            self.derniere_version = gestionnaire.version
+            etat = json.dumps(gestionnaire.obtenir_donnees_pieces())
+            # Envoyer uniquement si les données ont changé
+            if etat != self.dernier_etat:
+                self.dernier_etat = etat
+                messages.append(f"data: {etat}\n\n")
+
+        # Anomalies détectées depuis le dernier passage
+        for anomalie in gestionnaire.detecteur_anomalies.obtenir_anomalies(self.derniere_anomalie):
+            self.derniere_anomalie = anomalie['sequence']
+            messages.append(f"event: anomalie\ndata: {json.dumps(anomalie)}\n\n")
+
+        # Capteurs devenus obsolètes depuis le dernier passage
+        for evenement in gestionnaire.index_obsolescence.obtenir_evenements(self.dernier_obsolete):
+            self.dernier_obsolete = evenement['sequence']
+            messages.append(f"event: capteur_obsolete\ndata: {json.dumps(evenement)}\n\n")
+
+        return messages
+
+    def message_etat_courant(self) -> Optional[str]:
+        """Retourne le dernier état diffusé, à envoyer à un client qui vient de se connecter"""
+        if self.dernier_etat is None:
+            return None
+        return f"data: {self.dernier_etat}\n\n"
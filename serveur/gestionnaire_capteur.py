@@ -28,7 +28,11 @@ class SimulateurCapteur:
         """Démarre la simulation du capteur"""
         if not self.actif:
             self.actif = True
-            self.thread = threading.Thread(target=self._simuler, daemon=True)
+            self.thread = threading.Thread(
+                target=self._simuler,
+                name=f"simulateur-{self.type_capteur}-{self.piece_id}",
+                daemon=True
+            )
             self.thread.start()
             logger.info(f"Capteur {self.type_capteur} démarré pour la pièce {self.piece_id}")
     
@@ -3,8 +3,16 @@ Module pour la gestion des données des pièces et de la climatisation.
 Contient les classes et structures de données utilisées par le serveur central.
 """
 import time
+import bisect
+import threading
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from detection_anomalies import DetecteurAnomalies
+from surveillance_obsolescence import IndexObsolescence
+from consommation import CompteurConsommation
 
 
 @dataclass
@@ -27,60 +35,305 @@ class Piece:
     mode_automatique: bool = True  # Mode automatique activé par défaut
 
 
+# Types de capteurs acceptés (un attribut de Piece par type)
+TYPES_CAPTEURS = ('temperature', 'humidite', 'pression')
+
+# Champs exposés pour chaque pièce (l'identifiant est toujours inclus)
+CHAMPS_PIECE = ('temperature', 'humidite', 'pression', 'temperature_cible',
+                'climatisation_active', 'mode_automatique')
+
+
+def donnee_en_dict(donnee: Optional[DonneesCapteur]) -> Optional[Dict]:
+    """Convertit la donnée d'un capteur en dictionnaire sérialisable"""
+    if donnee is None:
+        return None
+    return {
+        'valeur': donnee.valeur,
+        'unite': donnee.unite,
+        'timestamp': donnee.timestamp
+    }
+
+
+def piece_en_dict(piece: Piece, champs: Optional[Sequence[str]] = None) -> Dict:
+    """Convertit une pièce en dictionnaire sérialisable, limité aux champs demandés le cas échéant"""
+    if champs is None:
+        champs = CHAMPS_PIECE
+    resultat = {'id': piece.id}
+    for champ in champs:
+        valeur = getattr(piece, champ)
+        if isinstance(valeur, DonneesCapteur):
+            valeur = donnee_en_dict(valeur)
+        resultat[champ] = valeur
+    return resultat
+
+
 class GestionnairePieces:
     """Classe pour gérer l'ensemble des pièces du système"""
-    def __init__(self):
+    
+    # Nombre maximal de suppressions mémorisées pour la synchronisation par deltas
+    SUPPRESSIONS_MAX = 10000
+    
+    def __init__(self, ttl: Optional[float] = None, stockage_froid=None):
         self.pieces: Dict[str, Piece] = {}
+        # Identifiants triés, maintenus à la création pour la pagination sans tri par requête
+        self.ids_tries: List[str] = []
+        self.detecteur_anomalies = DetecteurAnomalies()
+        self.index_obsolescence = IndexObsolescence()
+        self.compteur_consommation = CompteurConsommation()
+        # Verrou partagé entre le thread RPC, les workers d'ingestion et les requêtes Flask
+        self.verrou = threading.RLock()
+        # Version globale incrémentée à chaque modification, et dernière version de chaque pièce
+        # (ordonnées de la plus ancienne à la plus récente) pour la synchronisation par deltas
+        self.instance = uuid.uuid4().hex
+        self.version = 0
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Cycle de vie : les pièces sans modification depuis `ttl` secondes sont évincées
+        # (et déposées dans le stockage froid s'il est configuré, pour être réhydratées au prochain accès)
+        self.ttl = ttl
+        self.stockage_froid = stockage_froid
+        self._derniere_activite: Dict[str, float] = {}
+        # Pièces retirées (évincées ou supprimées) et version du retrait, transmises aux abonnés des deltas ;
+        # les abonnés dont le curseur précède la plus ancienne suppression oubliée doivent tout resynchroniser
+        self._suppressions: "OrderedDict[str, int]" = OrderedDict()
+        self._version_purge = 0
+        # Fonction (id_piece -> consigne ou None) fournie par le planificateur, appliquée aux nouvelles pièces
+        self.source_consignes: Optional[Callable[[str], Optional[float]]] = None
+    
+    def trouver_piece(self, id_piece: str) -> Optional[Piece]:
+        """Retourne une pièce existante (réhydratée depuis le stockage froid si besoin), sans jamais la créer"""
+        with self.verrou:
+            piece = self.pieces.get(id_piece)
+            if piece is None and self.stockage_froid is not None:
+                piece = self._rehydrater(id_piece)
+            return piece
     
     def obtenir_piece(self, id_piece: str) -> Piece:
         """Obtient une pièce ou en crée une nouvelle si elle n'existe pas"""
-        if id_piece not in self.pieces:
-            self.pieces[id_piece] = Piece(id=id_piece)
-        return self.pieces[id_piece]
+        with self.verrou:
+            piece = self.trouver_piece(id_piece)
+            if piece is None:
+                piece = self._inserer_piece(Piece(id=id_piece))
+            return piece
+    
+    def _piece_existante(self, id_piece: str) -> Piece:
+        """Retourne une pièce existante ou lève KeyError (appelé sous verrou)"""
+        piece = self.trouver_piece(id_piece)
+        if piece is None:
+            raise KeyError(id_piece)
+        return piece
+    
+    def _inserer_piece(self, piece: Piece) -> Piece:
+        """Ajoute une pièce au stockage en mémoire, avec la consigne planifiée en vigueur (appelé sous verrou)"""
+        if self.source_consignes is not None:
+            consigne = self.source_consignes(piece.id)
+            if consigne is not None:
+                piece.temperature_cible = consigne
+        self.pieces[piece.id] = piece
+        bisect.insort(self.ids_tries, piece.id)
+        self._suppressions.pop(piece.id, None)
+        self._marquer_modifiee(piece.id)
+        return piece
+    
+    def _rehydrater(self, id_piece: str) -> Optional[Piece]:
+        """Recharge une pièce depuis le stockage froid (appelé sous verrou)"""
+        donnees = self.stockage_froid.extraire(id_piece)
+        if donnees is None:
+            return None
+        piece = Piece(id=id_piece)
+        for type_capteur in TYPES_CAPTEURS:
+            donnee = donnees.get(type_capteur)
+            if donnee:
+                setattr(piece, type_capteur, DonneesCapteur(
+                    valeur=donnee['valeur'], timestamp=donnee['timestamp'], unite=donnee['unite']))
+        piece.temperature_cible = donnees['temperature_cible']
+        piece.climatisation_active = donnees['climatisation_active']
+        piece.mode_automatique = donnees['mode_automatique']
+        return self._inserer_piece(piece)
+    
+    def _retirer_piece(self, id_piece: str) -> None:
+        """Retire une pièce du stockage en mémoire et des index associés (appelé sous verrou)"""
+        del self.pieces[id_piece]
+        del self.ids_tries[bisect.bisect_left(self.ids_tries, id_piece)]
+        self._versions.pop(id_piece, None)
+        self._derniere_activite.pop(id_piece, None)
+        self.detecteur_anomalies.oublier_piece(id_piece)
+        self.index_obsolescence.oublier_piece(id_piece)
+        
+        self.version += 1
+        self._suppressions[id_piece] = self.version
+        self._suppressions.move_to_end(id_piece)
+        if len(self._suppressions) > self.SUPPRESSIONS_MAX:
+            _, self._version_purge = self._suppressions.popitem(last=False)
+    
+    def supprimer_piece(self, id_piece: str) -> bool:
+        """Supprime définitivement une pièce (mémoire, stockage froid et historique) ; retourne False si inconnue"""
+        with self.verrou:
+            existait = id_piece in self.pieces
+            if existait:
+                self._retirer_piece(id_piece)
+            if self.stockage_froid is not None and self.stockage_froid.supprimer(id_piece):
+                existait = True
+        if existait:
+            self.compteur_consommation.oublier_piece(id_piece)
+        return existait
+    
+    def evincer_pieces_inactives(self, maintenant: Optional[float] = None) -> int:
+        """
+        Évince les pièces sans modification depuis plus de `ttl` secondes et retourne leur nombre.
+        Les pièces sont parcourues de la moins récemment modifiée à la plus récente : le coût suit
+        le nombre de pièces évincées.
+        """
+        if self.ttl is None:
+            return 0
+        if maintenant is None:
+            maintenant = time.time()
+        limite = maintenant - self.ttl
+        
+        with self.verrou:
+            inactives = []
+            for id_piece in self._versions:
+                if self._derniere_activite[id_piece] > limite:
+                    break
+                inactives.append(id_piece)
+            if not inactives:
+                return 0
+            
+            if self.stockage_froid is not None:
+                self.stockage_froid.enregistrer({
+                    id_piece: piece_en_dict(self.pieces[id_piece]) for id_piece in inactives
+                })
+            for id_piece in inactives:
+                # Sans stockage froid, l'état de la climatisation est perdu : la période de marche
+                # en cours est close pour rester cohérente avec une pièce recréée climatisation arrêtée
+                if self.stockage_froid is None and self.pieces[id_piece].climatisation_active:
+                    self.compteur_consommation.enregistrer_transition(id_piece, False)
+                self._retirer_piece(id_piece)
+        return len(inactives)
+    
+    def _marquer_modifiee(self, id_piece: str) -> None:
+        """Attribue une nouvelle version à la pièce modifiée (appelé sous verrou, O(1))"""
+        self.version += 1
+        self._versions[id_piece] = self.version
+        self._versions.move_to_end(id_piece)
+        self._derniere_activite[id_piece] = time.time()
     
-    def enregistrer_donnee_capteur(self, id_piece: str, type_capteur: str, valeur: float, unite: str) -> None:
+    def enregistrer_donnees_capteurs(self, mesures: Iterable) -> None:
+        """Enregistre un lot de mesures (id_piece, type_capteur, valeur, unite, timestamp) en une seule prise de verrou"""
+        with self.verrou:
+            for id_piece, type_capteur, valeur, unite, timestamp in mesures:
+                self._enregistrer_donnee_capteur(id_piece, type_capteur, valeur, unite, timestamp)
+    
+    def enregistrer_donnee_capteur(self, id_piece: str, type_capteur: str, valeur: float, unite: str,
+                                   timestamp: Optional[float] = None) -> None:
         """Enregistre la donnée d'un capteur pour une pièce spécifique"""
+        with self.verrou:
+            self._enregistrer_donnee_capteur(id_piece, type_capteur, valeur, unite, timestamp)
+    
+    def _enregistrer_donnee_capteur(self, id_piece: str, type_capteur: str, valeur: float, unite: str,
+                                    timestamp: Optional[float]) -> None:
+        """Enregistre la donnée d'un capteur (appelé sous verrou) ; un type inconnu est ignoré sans créer la pièce"""
+        if type_capteur not in TYPES_CAPTEURS:
+            return
         piece = self.obtenir_piece(id_piece)
-        donnee = DonneesCapteur(valeur=valeur, unite=unite)
+        if timestamp is None:
+            donnee = DonneesCapteur(valeur=valeur, unite=unite)
+        else:
+            donnee = DonneesCapteur(valeur=valeur, timestamp=timestamp, unite=unite)
+        setattr(piece, type_capteur, donnee)
+        
+        self.index_obsolescence.enregistrer_mesure(id_piece, type_capteur, donnee.timestamp)
+        self.detecteur_anomalies.analyser(id_piece, type_capteur, valeur, donnee.timestamp)
         
         if type_capteur == "temperature":
-            piece.temperature = donnee
             self._verifier_ajustement_automatique(piece)
-        elif type_capteur == "humidite":
-            piece.humidite = donnee
-        elif type_capteur == "pression":
-            piece.pression = donnee
+        self._marquer_modifiee(id_piece)
+    
+    def appliquer_commandes(self, commandes: Dict[str, Dict[str, object]]) -> Dict[str, Optional[Dict]]:
+        """
+        Applique des commandes fusionnées {id_piece: {champ: valeur}} en une seule prise de verrou
+        et une seule modification par pièce. Les champs sont appliqués dans l'ordre du dictionnaire ;
+        l'ajustement automatique n'est évalué qu'une fois, sauf si la dernière commande force la
+        climatisation (comme une commande manuelle isolée).
+        Retourne les valeurs finales des champs commandés par pièce (None si la pièce est introuvable).
+        """
+        resultats = {}
+        with self.verrou:
+            for id_piece, champs in commandes.items():
+                dernier = next(reversed(champs), None)
+                if dernier is None:
+                    continue
+                piece = self.trouver_piece(id_piece)
+                if piece is None:
+                    resultats[id_piece] = None
+                    continue
+                for champ, valeur in champs.items():
+                    if champ == 'climatisation_active':
+                        self._changer_climatisation(piece, valeur)
+                    else:
+                        setattr(piece, champ, valeur)
+                if dernier != 'climatisation_active':
+                    self._verifier_ajustement_automatique(piece)
+                self._marquer_modifiee(id_piece)
+                resultats[id_piece] = {champ: getattr(piece, champ) for champ in champs}
+        return resultats
     
     def definir_temperature_cible(self, id_piece: str, temperature: float) -> None:
         """Définit la température cible pour une pièce"""
-        piece = self.obtenir_piece(id_piece)
-        piece.temperature_cible = temperature
-        self._verifier_ajustement_automatique(piece)
+        with self.verrou:
+            piece = self._piece_existante(id_piece)
+            piece.temperature_cible = temperature
+            self._verifier_ajustement_automatique(piece)
+            self._marquer_modifiee(id_piece)
+    
+    def definir_temperatures_cibles(self, consignes: Dict[str, float]) -> None:
+        """Définit les températures cibles de plusieurs pièces en une seule prise de verrou (pièces inconnues ignorées)"""
+        with self.verrou:
+            for id_piece, temperature in consignes.items():
+                piece = self.trouver_piece(id_piece)
+                if piece is None:
+                    continue
+                piece.temperature_cible = temperature
+                self._verifier_ajustement_automatique(piece)
+                self._marquer_modifiee(id_piece)
     
     def definir_etat_climatisation(self, id_piece: str, active: bool) -> None:
         """Définit l'état de la climatisation pour une pièce"""
-        piece = self.obtenir_piece(id_piece)
-        piece.climatisation_active = active
+        with self.verrou:
+            piece = self._piece_existante(id_piece)
+            self._changer_climatisation(piece, active)
+            self._marquer_modifiee(id_piece)
     
     def definir_mode_automatique(self, id_piece: str, auto: bool) -> None:
         """Active ou désactive le mode automatique pour une pièce"""
-        piece = self.obtenir_piece(id_piece)
-        piece.mode_automatique = auto
-        if auto:
-            self._verifier_ajustement_automatique(piece)
+        with self.verrou:
+            piece = self._piece_existante(id_piece)
+            piece.mode_automatique = auto
+            if auto:
+                self._verifier_ajustement_automatique(piece)
+            self._marquer_modifiee(id_piece)
     
     def _verifier_ajustement_automatique(self, piece: Piece) -> None:
         """Vérifie et ajuste l'état de la climatisation en mode automatique"""
         if not piece.mode_automatique or not piece.temperature:
             return
         
+        # Ne pas agir sur une température qui n'est plus rafraîchie par son capteur
+        if self.index_obsolescence.est_obsolete(piece.id, "temperature"):
+            return
+        
         # Logique d'ajustement automatique
         # Si la température actuelle est supérieure à la cible de plus de 0.5°C, activer la climatisation
         # Si la température actuelle est inférieure à la cible de plus de 0.5°C, désactiver la climatisation
         if piece.temperature.valeur > piece.temperature_cible + 0.5:
-            piece.climatisation_active = True
+            self._changer_climatisation(piece, True)
         elif piece.temperature.valeur < piece.temperature_cible - 0.5:
-            piece.climatisation_active = False
+            self._changer_climatisation(piece, False)
+    
+    def _changer_climatisation(self, piece: Piece, active: bool) -> None:
+        """Change l'état de la climatisation et comptabilise la transition le cas échéant"""
+        if piece.climatisation_active != active:
+            piece.climatisation_active = active
+            self.compteur_consommation.enregistrer_transition(piece.id, active)
     
     def obtenir_toutes_pieces(self) -> Dict[str, Piece]:
         """Retourne toutes les pièces enregistrées"""
@@ -88,27 +341,87 @@ class GestionnairePieces:
         
     def obtenir_donnees_pieces(self) -> Dict[str, Dict]:
         """Retourne les données des pièces dans un format sérialisable pour le RPC"""
+        with self.verrou:
+            pieces = list(self.pieces.items())
+        return {id_piece: piece_en_dict(piece) for id_piece, piece in pieces}
+    
+    def obtenir_changements(self, depuis: int = 0) -> Tuple[Dict[str, Dict], List[str], bool, int]:
+        """
+        Retourne les pièces modifiées et les pièces retirées après la version `depuis`, un indicateur
+        d'état complet et la version courante. L'état est complet (toutes les pièces, l'abonné doit
+        oublier celles absentes) si `depuis` précède les suppressions encore mémorisées.
+        Les parcours partent des entrées les plus récentes : leur coût suit le nombre de changements.
+        """
+        resultat = {}
+        supprimees = []
+        with self.verrou:
+            complet = depuis <= self._version_purge
+            for id_piece, version in reversed(self._versions.items()):
+                if version <= depuis:
+                    break
+                resultat[id_piece] = piece_en_dict(self.pieces[id_piece])
+            if not complet:
+                for id_piece, version in reversed(self._suppressions.items()):
+                    if version <= depuis:
+                        break
+                    supprimees.append(id_piece)
+            return resultat, supprimees, complet, self.version
+    
+    def fusionner_pieces_distantes(self, pieces: Dict[str, Dict]) -> None:
+        """
+        Remplace l'état de pièces par celui reçu d'un autre serveur (mode hub de fédération).
+        Aucun ajustement automatique n'est appliqué : il reste du ressort du serveur propriétaire.
+        """
+        with self.verrou:
+            for id_piece, donnees in pieces.items():
+                piece = self.obtenir_piece(id_piece)
+                for type_capteur in TYPES_CAPTEURS:
+                    donnee = donnees.get(type_capteur)
+                    setattr(piece, type_capteur, DonneesCapteur(
+                        valeur=donnee['valeur'], timestamp=donnee['timestamp'], unite=donnee['unite']
+                    ) if donnee else None)
+                piece.temperature_cible = donnees.get('temperature_cible', piece.temperature_cible)
+                self._changer_climatisation(piece, donnees.get('climatisation_active', piece.climatisation_active))
+                piece.mode_automatique = donnees.get('mode_automatique', piece.mode_automatique)
+                self._marquer_modifiee(id_piece)
+    
+    def obtenir_ids_pieces(self, prefixe: str = "") -> List[str]:
+        """Retourne les identifiants (triés) des pièces en mémoire commençant par le préfixe"""
+        with self.verrou:
+            debut = bisect.bisect_left(self.ids_tries, prefixe)
+            fin = debut
+            while fin < len(self.ids_tries) and self.ids_tries[fin].startswith(prefixe):
+                fin += 1
+            return self.ids_tries[debut:fin]
+    
+    def obtenir_page_pieces(self, curseur: Optional[str] = None, limite: Optional[int] = None,
+                            prefixe: str = "", champs: Optional[Sequence[str]] = None) -> Tuple[Dict[str, Dict], Optional[str]]:
+        """
+        Retourne une page de pièces ordonnées par identifiant, à partir de l'index trié.
+        - curseur : identifiant de la dernière pièce de la page précédente
+        - limite : nombre maximal de pièces (toutes si None)
+        - prefixe : ne retourne que les pièces dont l'identifiant commence par ce préfixe
+        - champs : projection sur un sous-ensemble de CHAMPS_PIECE ('id', toujours inclus, est accepté)
+        Retourne le dictionnaire des pièces et le curseur de la page suivante (None si dernière page).
+        """
+        if champs is not None:
+            champs = [champ for champ in champs if champ != 'id']
+            inconnus = [champ for champ in champs if champ not in CHAMPS_PIECE]
+            if inconnus:
+                raise ValueError(f"Champs inconnus: {', '.join(inconnus)}")
+        
         resultat = {}
-        for id_piece, piece in self.pieces.items():
-            resultat[id_piece] = {
-                'id': piece.id,
-                'temperature': {
-                    'valeur': piece.temperature.valeur,
-                    'unite': piece.temperature.unite,
-                    'timestamp': piece.temperature.timestamp
-                } if piece.temperature else None,
-                'humidite': {
-                    'valeur': piece.humidite.valeur,
-                    'unite': piece.humidite.unite,
-                    'timestamp': piece.humidite.timestamp
-                } if piece.humidite else None,
-                'pression': {
-                    'valeur': piece.pression.valeur,
-                    'unite': piece.pression.unite,
-                    'timestamp': piece.pression.timestamp
-                } if piece.pression else None,
-                'temperature_cible': piece.temperature_cible,
-                'climatisation_active': piece.climatisation_active,
-                'mode_automatique': piece.mode_automatique
-            }
-        return resultat
\ No newline at end of file
+        curseur_suivant = None
+        with self.verrou:
+            ids = self.ids_tries
+            position = bisect.bisect_left(ids, prefixe)
+            if curseur is not None:
+                position = max(position, bisect.bisect_right(ids, curseur))
+            while position < len(ids) and ids[position].startswith(prefixe):
+                if limite is not None and len(resultat) >= limite:
+                    curseur_suivant = ids[position - 1]
+                    break
+                id_piece = ids[position]
+                resultat[id_piece] = piece_en_dict(self.pieces[id_piece], champs)
+                position += 1
+        return resultat, curseur_suivant
@@ -0,0 +1,252 @@
+"""
+Module de planification horaire des températures cibles (mode automatique).
+Les programmes (par pièce ou par zone) sont précompilés en transitions hebdomadaires triées.
+Un tas global des prochaines transitions est servi par un unique thread, qui ne se réveille
+que lorsqu'une transition est due et applique toutes les transitions échues en un seul lot.
+"""
+import bisect
+import heapq
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECONDES_PAR_JOUR = 24 * 3600
+SECONDES_PAR_SEMAINE = 7 * SECONDES_PAR_JOUR
+
+CIBLE_PIECE = 'piece'
+CIBLE_ZONE = 'zone'
+
+
+class ProgrammeCompile:
+    """Programme hebdomadaire précompilé : décalages (secondes depuis lundi 00:00) et températures triés"""
+
+    def __init__(self, transitions: Sequence[Dict]):
+        if not isinstance(transitions, (list, tuple)) or not transitions:
+            raise ValueError("Le programme doit contenir une liste d'au moins une transition")
+        self.transitions = [dict(transition) for transition in transitions]
+        points = {}
+        for transition in transitions:
+            try:
+                heures, minutes = (int(partie) for partie in str(transition['heure']).split(':'))
+                temperature = float(transition['temperature'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Transition invalide: {transition}")
+            if not (0 <= heures < 24 and 0 <= minutes < 60):
+                raise ValueError(f"Heure invalide: {transition['heure']}")
+            jours = transition.get('jours')
+            if jours is None:
+                jours = range(7)
+            elif not isinstance(jours, (list, tuple)):
+                raise ValueError(f"Les jours doivent être une liste: {jours}")
+            for jour in jours:
+                try:
+                    jour = int(jour)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Jour invalide (0 = lundi, 6 = dimanche): {jour}")
+                if not 0 <= jour < 7:
+                    raise ValueError(f"Jour invalide (0 = lundi, 6 = dimanche): {jour}")
+                points[jour * SECONDES_PAR_JOUR + heures * 3600 + minutes * 60] = temperature
+        self.decalages: List[int] = sorted(points)
+        self.temperatures: List[float] = [points[decalage] for decalage in self.decalages]
+
+    @staticmethod
+    def _debut_semaine(maintenant: float) -> datetime:
+        """Retourne le lundi 00:00 (heure locale) de la semaine contenant `maintenant`"""
+        date = datetime.fromtimestamp(maintenant)
+        return datetime(date.year, date.month, date.day) - timedelta(days=date.weekday())
+
+    def consigne_courante(self, maintenant: float) -> float:
+        """Retourne la température en vigueur à l'instant donné"""
+        debut = self._debut_semaine(maintenant)
+        ecoule = (datetime.fromtimestamp(maintenant) - debut).total_seconds()
+        # L'indice -1 correspond à la dernière transition de la semaine précédente
+        return self.temperatures[bisect.bisect_right(self.decalages, ecoule) - 1]
+
+    def prochaine_transition(self, maintenant: float) -> Tuple[float, float]:
+        """Retourne (timestamp, température) de la première transition strictement postérieure"""
+        debut = self._debut_semaine(maintenant)
+        ecoule = (datetime.fromtimestamp(maintenant) - debut).total_seconds()
+        indice = bisect.bisect_right(self.decalages, ecoule)
+        if indice == len(self.decalages):
+            debut += timedelta(days=7)
+            indice = 0
+        date = debut + timedelta(seconds=self.decalages[indice])
+        return date.timestamp(), self.temperatures[indice]
+
+
+class PlanificateurConsignes:
+    """Classe gérant les programmes horaires et appliquant les transitions dues"""
+
+    def __init__(self, gestionnaire_pieces):
+        self.gestionnaire_pieces = gestionnaire_pieces
+        self._programmes: Dict[Tuple[str, str], ProgrammeCompile] = {}
+        self._zones: Dict[str, List[str]] = {}
+        # Génération par programme : invalide les entrées du tas lors d'une modification
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._tas: List[Tuple[float, int, str, str]] = []
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._actif = False
+        # Les pièces créées (ou réhydratées) après la définition d'un programme reçoivent sa consigne en vigueur
+        gestionnaire_pieces.source_consignes = self.consigne_en_vigueur
+
+    def demarrer(self) -> None:
+        """Démarre le thread de planification"""
+        if self._actif:
+            return
+        self._actif = True
+        self._thread = threading.Thread(target=self._executer, name="planification", daemon=True)
+        self._thread.start()
+        logger.info("Planificateur de consignes démarré")
+
+    def arreter(self) -> None:
+        """Arrête le thread de planification"""
+        with self._condition:
+            self._actif = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def definir_programme_piece(self, id_piece: str, transitions: Sequence[Dict]) -> None:
+        """Définit (ou remplace) le programme horaire d'une pièce"""
+        self._definir_programme((CIBLE_PIECE, id_piece), ProgrammeCompile(transitions))
+
+    def definir_programme_zone(self, zone: str, pieces: Sequence[str], transitions: Sequence[Dict]) -> None:
+        """Définit (ou remplace) le programme horaire d'une zone regroupant plusieurs pièces"""
+        if not isinstance(pieces, (list, tuple)) or not all(isinstance(piece, str) for piece in pieces):
+            raise ValueError("Les pièces de la zone doivent être une liste d'identifiants")
+        programme = ProgrammeCompile(transitions)
+        with self._condition:
+            self._zones[zone] = list(pieces)
+        self._definir_programme((CIBLE_ZONE, zone), programme)
+
+    def supprimer_programme(self, type_cible: str, id_cible: str) -> bool:
+        """
+        Supprime un programme ; ses entrées dans le tas deviennent périmées.
+        Une pièce dont le programme est supprimé reprend la consigne en vigueur de sa zone.
+        """
+        cle = (type_cible, id_cible)
+        consignes = {}
+        with self._condition:
+            if cle not in self._programmes:
+                return False
+            del self._programmes[cle]
+            self._generations[cle] = self._generations.get(cle, 0) + 1
+            if type_cible == CIBLE_ZONE:
+                self._zones.pop(id_cible, None)
+            else:
+                for zone, pieces in self._zones.items():
+                    if id_cible in pieces:
+                        programme = self._programmes[(CIBLE_ZONE, zone)]
+                        consignes[id_cible] = programme.consigne_courante(time.time())
+                        break
+        if consignes:
+            self.gestionnaire_pieces.definir_temperatures_cibles(consignes)
+        return True
+
+    def consigne_en_vigueur(self, id_piece: str, maintenant: Optional[float] = None) -> Optional[float]:
+        """Retourne la consigne en vigueur pour une pièce (son programme, sinon celui de sa zone), ou None"""
+        if maintenant is None:
+            maintenant = time.time()
+        with self._condition:
+            programme = self._programmes.get((CIBLE_PIECE, id_piece))
+            if programme is None:
+                for zone, pieces in self._zones.items():
+                    if id_piece in pieces:
+                        programme = self._programmes[(CIBLE_ZONE, zone)]
+                        break
+            return programme.consigne_courante(maintenant) if programme is not None else None
+
+    def obtenir_pieces_zone(self, zone: str) -> Optional[List[str]]:
+        """Retourne les pièces d'une zone (None si la zone n'existe pas)"""
+        with self._condition:
+            pieces = self._zones.get(zone)
+            return list(pieces) if pieces is not None else None
+
+    def obtenir_programmes(self) -> Dict:
+        """Retourne les programmes définis et la prochaine transition de chacun"""
+        maintenant = time.time()
+        resultat = {'pieces': {}, 'zones': {}}
+        with self._condition:
+            for (type_cible, id_cible), programme in self._programmes.items():
+                prochaine, temperature = programme.prochaine_transition(maintenant)
+                description = {
+                    'transitions': programme.transitions,
+                    'consigne_courante': programme.consigne_courante(maintenant),
+                    'prochaine_transition': {'timestamp': prochaine, 'temperature': temperature}
+                }
+                if type_cible == CIBLE_ZONE:
+                    description['pieces'] = self._zones.get(id_cible, [])
+                    resultat['zones'][id_cible] = description
+                else:
+                    resultat['pieces'][id_cible] = description
+        return resultat
+
+    def _definir_programme(self, cle: Tuple[str, str], programme: ProgrammeCompile) -> None:
+        """Enregistre le programme, applique la consigne en vigueur et planifie sa prochaine transition"""
+        maintenant = time.time()
+        with self._condition:
+            self._programmes[cle] = programme
+            generation = self._generations.get(cle, 0) + 1
+            self._generations[cle] = generation
+            prochaine, _ = programme.prochaine_transition(maintenant)
+            heapq.heappush(self._tas, (prochaine, generation, cle[0], cle[1]))
+            consignes = self._consignes_pour(cle, programme.consigne_courante(maintenant))
+            self._condition.notify()
+        self.gestionnaire_pieces.definir_temperatures_cibles(consignes)
+
+    def _consignes_pour(self, cle: Tuple[str, str], temperature: float) -> Dict[str, float]:
+        """Développe une cible en consignes par pièce ; un programme de pièce prime sur celui de sa zone"""
+        type_cible, id_cible = cle
+        if type_cible == CIBLE_PIECE:
+            return {id_cible: temperature}
+        return {
+            id_piece: temperature
+            for id_piece in self._zones.get(id_cible, [])
+            if (CIBLE_PIECE, id_piece) not in self._programmes
+        }
+
+    def _executer(self) -> None:
+        """Boucle du thread : attend la prochaine transition puis applique toutes celles échues"""
+        while True:
+            with self._condition:
+                while self._actif:
+                    attente = self._tas[0][0] - time.time() if self._tas else None
+                    if attente is not None and attente <= 0:
+                        break
+                    self._condition.wait(attente)
+                if not self._actif:
+                    return
+                consignes = self._extraire_transitions_dues(time.time())
+
+            if consignes:
+                try:
+                    self.gestionnaire_pieces.definir_temperatures_cibles(consignes)
+                    logger.info(f"Planification: {len(consignes)} consigne(s) appliquée(s)")
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'application des consignes planifiées: {e}")
+
+    def _extraire_transitions_dues(self, maintenant: float) -> Dict[str, float]:
+        """Dépile les transitions échues et replanifie les suivantes (appelé sous verrou)"""
+        consignes_zones: Dict[str, float] = {}
+        consignes_pieces: Dict[str, float] = {}
+        while self._tas and self._tas[0][0] <= maintenant:
+            echeance, generation, type_cible, id_cible = heapq.heappop(self._tas)
+            cle = (type_cible, id_cible)
+            programme = self._programmes.get(cle)
+            if programme is None or self._generations.get(cle) != generation:
+                continue
+            # La consigne est évaluée juste après l'échéance pour retenir la transition échue
+            temperature = programme.consigne_courante(echeance + 1)
+            cible = consignes_pieces if type_cible == CIBLE_PIECE else consignes_zones
+            cible.update(self._consignes_pour(cle, temperature))
+            prochaine, _ = programme.prochaine_transition(max(maintenant, echeance + 1))
+            heapq.heappush(self._tas, (prochaine, generation, type_cible, id_cible))
+        # Les consignes de pièce sont appliquées après celles de zone pour les remplacer
+        consignes_zones.update(consignes_pieces)
+        return consignes_zones
@@ -0,0 +1,353 @@
+"""
+Serveur de production asynchrone (asyncio) pour le système de gestion de climatisation.
+Une seule boucle d'événements sert deux ports aux rôles séparés :
+- le port HTTP : les connexions SSE de /api/stream, sous forme de coroutines peu coûteuses
+  alimentées par un diffuseur unique (l'état n'est construit qu'une fois par intervalle pour
+  tous les clients), avec battement de cœur et fermeture des clients trop lents, et les autres
+  routes REST, déléguées à l'application Flask (WSGI) dans un pool de threads borné ;
+- le port RPC : uniquement l'ingestion XML-RPC (/RPC2), décodée, exécutée et encodée dans
+  le pool de threads.
+Les connexions HTTP persistantes inactives sont fermées après un délai.
+"""
+import io
+import sys
+import asyncio
+import functools
+import logging
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote_to_bytes
+
+from flux_evenements import SuiviFluxEvenements
+import diagnostic
+
+logger = logging.getLogger(__name__)
+
+TAILLE_MAX_CORPS = 1024 * 1024
+NB_ENTETES_MAX = 100
+
+RAISONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+}
+
+# Rôles des ports d'écoute
+ROLE_HTTP = 'http'
+ROLE_RPC = 'rpc'
+CHEMINS_RPC = ('/RPC2', '/')
+
+
+class ErreurRequete(Exception):
+    """Requête HTTP rejetée avant traitement, avec le statut à renvoyer"""
+
+    def __init__(self, statut: int):
+        super().__init__(statut)
+        self.statut = statut
+
+
+class DiffuseurEvenements:
+    """Construit les messages SSE une fois par intervalle et les diffuse à toutes les connexions"""
+
+    def __init__(self, gestionnaire_pieces, intervalle: float = 1.0, taille_file: int = 64):
+        self.suivi = SuiviFluxEvenements(gestionnaire_pieces)
+        self.intervalle = intervalle
+        self.taille_file = taille_file
+        self.abonnes: Set[asyncio.Queue] = set()
+
+    def abonner(self) -> asyncio.Queue:
+        """Inscrit une nouvelle connexion et lui envoie immédiatement le dernier état connu"""
+        file = asyncio.Queue(maxsize=self.taille_file)
+        etat = self.suivi.message_etat_courant()
+        if etat:
+            file.put_nowait(etat.encode('utf-8'))
+        self.abonnes.add(file)
+        return file
+
+    def desabonner(self, file: asyncio.Queue) -> None:
+        """Retire une connexion de la diffusion"""
+        self.abonnes.discard(file)
+
+    def _construire_messages(self) -> List[str]:
+        """Construit les messages dans un thread du pool, étiqueté 'sse' pour le diagnostic"""
+        diagnostic.etiqueter_thread('sse')
+        try:
+            return self.suivi.messages()
+        finally:
+            diagnostic.retirer_etiquette_thread()
+
+    async def executer(self, executeur: ThreadPoolExecutor) -> None:
+        """Boucle de diffusion : construit les messages hors de la boucle puis les répartit"""
+        boucle = asyncio.get_running_loop()
+        while True:
+            try:
+                messages = await boucle.run_in_executor(executeur, self._construire_messages)
+            except Exception as e:
+                logger.error(f"Erreur lors de la construction du flux SSE: {e}")
+                messages = []
+            if messages and self.abonnes:
+                donnees = ''.join(messages).encode('utf-8')
+                for file in list(self.abonnes):
+                    try:
+                        file.put_nowait(donnees)
+                    except asyncio.QueueFull:
+                        # Client trop lent : il est déconnecté plutôt que de retenir de la mémoire
+                        self.desabonner(file)
+                        file.get_nowait()
+                        file.put_nowait(None)
+            await asyncio.sleep(self.intervalle)
+
+
+class ServeurAsync:
+    """Serveur HTTP/1.1 minimal sur asyncio combinant SSE, XML-RPC et application WSGI"""
+
+    def __init__(self, app, rpc_handler, gestionnaire_pieces, nb_threads: int = 16,
+                 delai_inactivite: float = 30.0, battement: float = 15.0, delai_ecriture: float = 30.0):
+        self.app = app
+        self.rpc_handler = rpc_handler
+        self.delai_inactivite = delai_inactivite
+        self.battement = battement
+        self.delai_ecriture = delai_ecriture
+        self.executeur = ThreadPoolExecutor(max_workers=nb_threads, thread_name_prefix='flask-async')
+        self.diffuseur = DiffuseurEvenements(gestionnaire_pieces)
+
+    async def demarrer(self, hote: str, port_http: int, port_rpc: int) -> None:
+        """Écoute sur les ports HTTP et RPC (même boucle, rôles séparés) jusqu'à l'arrêt"""
+        roles = {port_http: ROLE_HTTP, port_rpc: ROLE_RPC}
+        serveurs = [
+            await asyncio.start_server(functools.partial(self._servir_connexion, role), hote, port, backlog=1024)
+            for port, role in roles.items()
+        ]
+        for port, role in roles.items():
+            logger.info(f"Serveur asynchrone ({role}) à l'écoute sur http://{hote}:{port}")
+        diagnostic.etiqueter_thread('boucle-async')
+        diffusion = asyncio.create_task(self.diffuseur.executer(self.executeur))
+        try:
+            await asyncio.gather(*(serveur.serve_forever() for serveur in serveurs))
+        finally:
+            diffusion.cancel()
+            self.executeur.shutdown(wait=False)
+
+    async def _lire_ligne(self, reader: asyncio.StreamReader, statut_trop_longue: int) -> bytes:
+        """Lit une ligne ; une ligne dépassant la limite du lecteur est rejetée avec le statut donné"""
+        try:
+            return await asyncio.wait_for(reader.readline(), timeout=self.delai_inactivite)
+        except ValueError:
+            raise ErreurRequete(statut_trop_longue)
+
+    async def _lire_corps_fragmente(self, reader: asyncio.StreamReader) -> bytes:
+        """Lit un corps en Transfer-Encoding: chunked, borné à TAILLE_MAX_CORPS"""
+        corps = bytearray()
+        while True:
+            ligne = await self._lire_ligne(reader, 400)
+            try:
+                taille = int(ligne.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise ErreurRequete(400)
+            if taille < 0:
+                raise ErreurRequete(400)
+            if taille == 0:
+                break
+            if len(corps) + taille > TAILLE_MAX_CORPS:
+                raise ErreurRequete(413)
+            fragment = await asyncio.wait_for(reader.readexactly(taille + 2), timeout=self.delai_inactivite)
+            if fragment[-2:] != b'\r\n':
+                raise ErreurRequete(400)
+            corps += fragment[:-2]
+        # En-têtes de fin éventuels, ignorés
+        for _ in range(NB_ENTETES_MAX):
+            if await self._lire_ligne(reader, 431) in (b'\r\n', b'\n', b''):
+                return bytes(corps)
+        raise ErreurRequete(431)
+
+    async def _lire_requete(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        """Lit une requête (méthode, chemin, version, en-têtes, corps) ; None si la connexion est fermée"""
+        ligne = await self._lire_ligne(reader, 400)
+        if not ligne:
+            return None
+        parties = ligne.decode('latin-1').rstrip('\r\n').split(' ')
+        if len(parties) != 3:
+            raise ErreurRequete(400)
+        methode, cible, version = parties
+
+        entetes: Dict[str, str] = {}
+        for _ in range(NB_ENTETES_MAX):
+            ligne = await self._lire_ligne(reader, 431)
+            if ligne in (b'\r\n', b'\n', b''):
+                break
+            nom, _, valeur = ligne.decode('latin-1').partition(':')
+            entetes[nom.strip().lower()] = valeur.strip()
+        else:
+            raise ErreurRequete(431)
+
+        fragmente = 'chunked' in entetes.get('transfer-encoding', '').lower()
+        try:
+            longueur = 0 if fragmente else int(entetes.get('content-length', 0) or 0)
+        except ValueError:
+            raise ErreurRequete(400)
+        if longueur < 0:
+            raise ErreurRequete(400)
+        if longueur > TAILLE_MAX_CORPS:
+            raise ErreurRequete(413)
+
+        # Le client attend l'accord du serveur avant d'envoyer son corps
+        if (fragmente or longueur) and entetes.get('expect', '').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await asyncio.wait_for(writer.drain(), timeout=self.delai_ecriture)
+
+        if fragmente:
+            corps = await self._lire_corps_fragmente(reader)
+        elif longueur:
+            corps = await asyncio.wait_for(reader.readexactly(longueur), timeout=self.delai_inactivite)
+        else:
+            corps = b''
+        return methode, cible, version, entetes, corps
+
+    async def _servir_connexion(self, role: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Traite les requêtes successives d'une connexion persistante, selon le rôle du port"""
+        pair = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                try:
+                    requete = await self._lire_requete(reader, writer)
+                except ErreurRequete as e:
+                    await self._ecrire_reponse(writer, e.statut, [], b'', garder=False)
+                    return
+                if requete is None:
+                    return
+                methode, cible, version, entetes, corps = requete
+                chemin, _, requete_chaine = cible.partition('?')
+
+                connexion = entetes.get('connection', '').lower()
+                garder = connexion != 'close' if version == 'HTTP/1.1' else connexion == 'keep-alive'
+
+                if role == ROLE_RPC:
+                    if chemin not in CHEMINS_RPC:
+                        statut, entetes_reponse, contenu = 404, [], b''
+                    elif methode != 'POST':
+                        statut, entetes_reponse, contenu = 405, [('Allow', 'POST')], b''
+                    else:
+                        statut, entetes_reponse, contenu = await asyncio.get_running_loop().run_in_executor(
+                            self.executeur, self._servir_rpc, corps)
+                elif chemin == '/api/stream' and methode == 'GET':
+                    await self._servir_flux(writer)
+                    return
+                else:
+                    statut, entetes_reponse, contenu = await asyncio.get_running_loop().run_in_executor(
+                        self.executeur, self._servir_wsgi, methode, chemin, requete_chaine, entetes, corps, pair)
+                await self._ecrire_reponse(writer, statut, entetes_reponse, contenu, garder,
+                                           sans_corps=methode == 'HEAD')
+                if not garder:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ecrire_reponse(self, writer: asyncio.StreamWriter, statut, entetes: List[Tuple[str, str]],
+                              contenu: bytes, garder: bool, sans_corps: bool = False) -> None:
+        """Écrit une réponse complète, en ajoutant Content-Length et Connection (sans corps pour HEAD)"""
+        if isinstance(statut, int):
+            statut = f"{statut} {RAISONS.get(statut, '')}"
+        lignes = [f"HTTP/1.1 {statut}"]
+        lignes += [f"{nom}: {valeur}" for nom, valeur in entetes
+                   if nom.lower() not in ('content-length', 'connection')]
+        lignes.append(f"Content-Length: {len(contenu)}")
+        lignes.append(f"Connection: {'keep-alive' if garder else 'close'}")
+        writer.write(('\r\n'.join(lignes) + '\r\n\r\n').encode('latin-1') + (b'' if sans_corps else contenu))
+        await asyncio.wait_for(writer.drain(), timeout=self.delai_ecriture)
+
+    async def _servir_flux(self, writer: asyncio.StreamWriter) -> None:
+        """Connexion SSE : coroutine alimentée par le diffuseur, avec battement de cœur"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+        file = self.diffuseur.abonner()
+        try:
+            while True:
+                try:
+                    donnees = await asyncio.wait_for(file.get(), timeout=self.battement)
+                except asyncio.TimeoutError:
+                    donnees = b": ping\n\n"  # Commentaire SSE : maintient la connexion et détecte les clients partis
+                if donnees is None:
+                    return
+                writer.write(donnees)
+                await asyncio.wait_for(writer.drain(), timeout=self.delai_ecriture)
+        finally:
+            self.diffuseur.desabonner(file)
+
+    def _servir_rpc(self, corps: bytes) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """
+        Décode un appel XML-RPC, l'exécute sur le gestionnaire RPC et encode la réponse.
+        Exécuté dans le pool de threads : la boucle ne fait que les entrées/sorties réseau.
+        Le thread est étiqueté 'rpc' le temps de l'appel pour le diagnostic par rôle.
+        """
+        diagnostic.etiqueter_thread('rpc')
+        try:
+            parametres, methode = xmlrpc.client.loads(corps)
+            fonction = getattr(self.rpc_handler, methode, None) if not methode.startswith('_') else None
+            if fonction is None:
+                raise xmlrpc.client.Fault(1, f"Méthode inconnue: {methode}")
+            resultat = fonction(*parametres)
+            reponse = xmlrpc.client.dumps((resultat,), methodresponse=True, allow_none=True)
+        except xmlrpc.client.Fault as fault:
+            reponse = xmlrpc.client.dumps(fault, allow_none=True)
+        except Exception as e:
+            reponse = xmlrpc.client.dumps(xmlrpc.client.Fault(1, f"{type(e).__name__}: {e}"), allow_none=True)
+        finally:
+            diagnostic.retirer_etiquette_thread()
+        return 200, [('Content-Type', 'text/xml')], reponse.encode('utf-8')
+
+    def _servir_wsgi(self, methode: str, chemin: str, requete_chaine: str, entetes: Dict[str, str],
+                     corps: bytes, pair) -> Tuple[str, List[Tuple[str, str]], bytes]:
+        """Exécute l'application WSGI (Flask) dans un thread du pool et retourne la réponse complète"""
+        environ = {
+            'REQUEST_METHOD': methode,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(chemin).decode('latin-1'),
+            'QUERY_STRING': requete_chaine,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': pair[0],
+            'CONTENT_TYPE': entetes.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(corps)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(corps),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for nom, valeur in entetes.items():
+            if nom not in ('content-type', 'content-length'):
+                environ['HTTP_' + nom.upper().replace('-', '_')] = valeur
+
+        reponse = {}
+
+        def start_response(statut, entetes_reponse, exc_info=None):
+            reponse['statut'] = statut
+            reponse['entetes'] = entetes_reponse
+
+        try:
+            resultat = self.app(environ, start_response)
+            try:
+                contenu = b''.join(resultat)
+            finally:
+                if hasattr(resultat, 'close'):
+                    resultat.close()
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement de {methode} {chemin}: {e}")
+            return '500 Internal Server Error', [('Content-Type', 'text/plain')], b''
+        return reponse['statut'], reponse['entetes'], contenu
+
+
+def lancer(app, rpc_handler, gestionnaire_pieces, hote: str = '0.0.0.0', port_http: int = 5000,
+           port_rpc: int = 8000, nb_threads: int = 16) -> None:
+    """Lance le serveur asynchrone (bloquant)"""
+    serveur = ServeurAsync(app, rpc_handler, gestionnaire_pieces, nb_threads=nb_threads)
+    try:
+        asyncio.run(serveur.demarrer(hote, port_http, port_rpc))
+    except KeyboardInterrupt:
+        logger.info("Arrêt du serveur asynchrone")
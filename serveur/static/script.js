@@ -25,6 +25,13 @@
   let currentRooms = {};
   let selectedId = null;
 
+  // Control commands are debounced and sent as one batch; later clicks on the same field replace earlier ones
+  const COMMAND_DEBOUNCE_MS = 250;
+  const pendingCommands = new Map();   // "room|field" -> { piece, champ, valeur } not sent yet
+  const inflightCommands = new Map();  // same, sent but not acknowledged yet
+  let commandTimer = null;
+  let commandChain = Promise.resolve();  // batches are sent one after another so an older one never wins
+
   function formatValue(value, unit){
     if (value === null || value === undefined) return '—';
     if (typeof value === 'number') return `${value.toFixed(1)}${unit}`;
@@ -123,20 +130,69 @@
     setTimeout(()=>card.classList.remove('fade-in'), 300);
   }
 
-  async function adjustTarget(id, delta){
+  // Overlay commands not yet acknowledged on top of server state, so stream updates don't undo local clicks
+  function applyPendingCommands(rooms){
+    [inflightCommands, pendingCommands].forEach(commands => commands.forEach(c => {
+      if (rooms[c.piece]) rooms[c.piece][c.champ] = c.valeur;
+    }));
+    return rooms;
+  }
+
+  function queueCommand(id, champ, valeur){
+    pendingCommands.set(`${id}|${champ}`, { piece: id, champ, valeur });
+    if (currentRooms[id]){
+      currentRooms[id][champ] = valeur;
+      renderCard(id, currentRooms[id]); updateStats();
+      if (selectedId === id) renderDetail();
+    }
+    clearTimeout(commandTimer);
+    commandTimer = setTimeout(flushCommands, COMMAND_DEBOUNCE_MS);
+  }
+
+  function flushCommands(){
+    commandChain = commandChain.then(sendCommands);
+    return commandChain;
+  }
+
+  async function sendCommands(){
+    if (!pendingCommands.size) return;
+    const batch = new Map(pendingCommands);
+    pendingCommands.clear();
+    batch.forEach((c, key) => inflightCommands.set(key, c));
+    try {
+      const res = await fetch('/api/commandes', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ commandes: [...batch.values()] }) });
+      if (!res.ok) throw new Error('Erreur lors de l\'envoi des commandes');
+      const ack = await res.json();
+      // Acknowledged final values replace the optimistic ones (unless a newer click is already queued)
+      Object.entries(ack.pieces || {}).forEach(([id, fields]) => {
+        if (!currentRooms[id]) return;
+        Object.entries(fields).forEach(([champ, valeur]) => {
+          if (!pendingCommands.has(`${id}|${champ}`)) currentRooms[id][champ] = valeur;
+        });
+        renderCard(id, currentRooms[id]);
+      });
+      if ((ack.introuvables || []).length) console.warn('Pièces introuvables:', ack.introuvables);
+    } catch (e){
+      console.error(e);
+    } finally {
+      batch.forEach((c, key) => { if (inflightCommands.get(key) === c) inflightCommands.delete(key); });
+      updateStats();
+      if (selectedId) renderDetail();
+    }
+  }
+
+  function adjustTarget(id, delta){
     const current = currentRooms[id]?.temperature_cible ?? 21;
     const next = Math.max(15, Math.min(30, Math.round((current+delta)*2)/2));
-    await fetch(`/api/pieces/${id}/temperature-cible`, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ temperature: next }) });
+    queueCommand(id, 'temperature_cible', next);
   }
 
-  async function updateAC(id, active){
-    const res = await fetch(`/api/pieces/${id}/climatisation`, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ active }) });
-    if (!res.ok) console.error('Erreur MAJ Climatisation');
+  function updateAC(id, active){
+    queueCommand(id, 'climatisation_active', active);
   }
 
-  async function updateAuto(id, auto){
-    const res = await fetch(`/api/pieces/${id}/mode-automatique`, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ auto }) });
-    if (!res.ok) console.error('Erreur MAJ Mode auto');
+  function updateAuto(id, auto){
+    queueCommand(id, 'mode_automatique', auto);
   }
 
   // Detail view
@@ -256,14 +312,14 @@
   function init(){
     fetch('/api/pieces').then(r=>r.json()).then(data=>{
       roomsContainer.innerHTML='';
-      currentRooms = data; updateStats();
+      currentRooms = applyPendingCommands(data); updateStats();
       Object.entries(currentRooms).forEach(([id, d])=> renderCard(id, d));
     });
 
     const es = new EventSource('/api/stream');
     es.onmessage = evt => {
       const data = JSON.parse(evt.data);
-      currentRooms = data; updateStats();
+      currentRooms = applyPendingCommands(data); updateStats();
       Object.entries(currentRooms).forEach(([id, d])=> renderCard(id, d));
       if (selectedId) renderDetail();
     }
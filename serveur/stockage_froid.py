@@ -0,0 +1,50 @@
+"""
+Module de stockage froid des pièces inactives.
+Les pièces évincées de la mémoire sont sérialisées en JSON compressé (zlib) dans une base
+SQLite, puis réhydratées (et retirées du stockage) lors de leur prochain accès.
+"""
+import json
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Optional
+
+
+class StockageFroid:
+    """Classe de stockage compact des pièces évincées, adossée à SQLite"""
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self._connexion.execute(
+            "CREATE TABLE IF NOT EXISTS pieces (id TEXT PRIMARY KEY, donnees BLOB NOT NULL)"
+        )
+        self._connexion.commit()
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, pieces: Dict[str, Dict]) -> None:
+        """Enregistre (ou remplace) un lot de pièces sérialisées"""
+        lignes = [
+            (id_piece, zlib.compress(json.dumps(donnees, separators=(',', ':')).encode('utf-8')))
+            for id_piece, donnees in pieces.items()
+        ]
+        with self._verrou:
+            self._connexion.executemany("INSERT OR REPLACE INTO pieces (id, donnees) VALUES (?, ?)", lignes)
+            self._connexion.commit()
+
+    def extraire(self, id_piece: str) -> Optional[Dict]:
+        """Retourne et retire du stockage les données d'une pièce (None si absente)"""
+        with self._verrou:
+            ligne = self._connexion.execute("SELECT donnees FROM pieces WHERE id = ?", (id_piece,)).fetchone()
+            if ligne is None:
+                return None
+            self._connexion.execute("DELETE FROM pieces WHERE id = ?", (id_piece,))
+            self._connexion.commit()
+        return json.loads(zlib.decompress(ligne[0]).decode('utf-8'))
+
+    def supprimer(self, id_piece: str) -> bool:
+        """Supprime définitivement une pièce du stockage ; retourne False si elle n'y était pas"""
+        with self._verrou:
+            curseur = self._connexion.execute("DELETE FROM pieces WHERE id = ?", (id_piece,))
+            self._connexion.commit()
+        return curseur.rowcount > 0
@@ -0,0 +1,127 @@
+"""
+Module de surveillance des capteurs obsolètes (capteurs qui ont cessé d'émettre).
+Maintient un index d'échéances (tas trié par date de prochaine mesure attendue) mis à jour
+à chaque réception, afin de trouver les capteurs muets sans parcourir toutes les pièces.
+"""
+import heapq
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal (en secondes) entre deux mesures avant qu'un capteur soit déclaré obsolète.
+# Les simulateurs émettent toutes les 2-4 s (température), 20-30 s (humidité) et 5-6 s (pression).
+DELAIS_PAR_DEFAUT: Dict[str, float] = {
+    'temperature': 15.0,
+    'humidite': 90.0,
+    'pression': 30.0,
+}
+
+
+@dataclass
+class EvenementObsolescence:
+    """Classe représentant un événement « capteur obsolète »"""
+    sequence: int
+    id_piece: str
+    type_capteur: str
+    derniere_mesure: float  # Timestamp de la dernière mesure reçue
+    echeance: float  # Timestamp auquel une nouvelle mesure était attendue
+    evenement: str = "capteur obsolète"
+
+
+class IndexObsolescence:
+    """Classe pour détecter les capteurs obsolètes à l'aide d'un tas d'échéances"""
+
+    def __init__(self, delais: Optional[Dict[str, float]] = None, historique_max: int = 500):
+        self.delais = delais if delais is not None else DELAIS_PAR_DEFAUT
+        # Échéance courante par capteur : {(id_piece, type_capteur): (echeance, derniere_mesure)}
+        self._echeances: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # Tas (echeance, id_piece, type_capteur) ; les entrées périmées sont ignorées à l'extraction
+        self._tas: List[Tuple[float, str, str]] = []
+        self._obsoletes: Dict[Tuple[str, str], EvenementObsolescence] = {}
+        self._evenements: Deque[EvenementObsolescence] = deque(maxlen=historique_max)
+        self._sequence = 0
+        self._verrou = threading.Lock()
+
+    def enregistrer_mesure(self, id_piece: str, type_capteur: str, timestamp: float) -> None:
+        """Repousse l'échéance du capteur suite à la réception d'une mesure (O(log n))"""
+        delai = self.delais.get(type_capteur)
+        if delai is None:
+            return
+
+        cle = (id_piece, type_capteur)
+        echeance = timestamp + delai
+        with self._verrou:
+            self._echeances[cle] = (echeance, timestamp)
+            self._obsoletes.pop(cle, None)
+            heapq.heappush(self._tas, (echeance, id_piece, type_capteur))
+            # Compactage du tas lorsque les entrées périmées deviennent majoritaires
+            # (les capteurs déjà signalés obsolètes n'y reviennent pas, pour ne pas être signalés à nouveau)
+            if len(self._tas) > 4 * len(self._echeances) + 64:
+                self._tas = [(e, p, t) for (p, t), (e, _) in self._echeances.items()
+                             if (p, t) not in self._obsoletes]
+                heapq.heapify(self._tas)
+
+    def collecter_expires(self, maintenant: Optional[float] = None) -> List[EvenementObsolescence]:
+        """Extrait les échéances dépassées et retourne les nouveaux événements d'obsolescence"""
+        if maintenant is None:
+            maintenant = time.time()
+
+        nouveaux = []
+        with self._verrou:
+            while self._tas and self._tas[0][0] <= maintenant:
+                echeance, id_piece, type_capteur = heapq.heappop(self._tas)
+                cle = (id_piece, type_capteur)
+                courante = self._echeances.get(cle)
+                # Entrée périmée : une mesure plus récente a repoussé l'échéance, ou capteur déjà signalé
+                if courante is None or courante[0] != echeance or cle in self._obsoletes:
+                    continue
+                self._sequence += 1
+                evenement = EvenementObsolescence(self._sequence, id_piece, type_capteur, courante[1], echeance)
+                self._obsoletes[cle] = evenement
+                self._evenements.append(evenement)
+                nouveaux.append(evenement)
+
+        for evenement in nouveaux:
+            logger.warning(f"Capteur obsolète - Pièce: {evenement.id_piece}, Capteur: {evenement.type_capteur}")
+        return nouveaux
+
+    def oublier_piece(self, id_piece: str) -> None:
+        """Cesse de surveiller les capteurs d'une pièce ; ses entrées du tas deviennent périmées"""
+        with self._verrou:
+            for type_capteur in self.delais:
+                self._echeances.pop((id_piece, type_capteur), None)
+                self._obsoletes.pop((id_piece, type_capteur), None)
+
+    def est_obsolete(self, id_piece: str, type_capteur: str, maintenant: Optional[float] = None) -> bool:
+        """Indique si le capteur a dépassé son échéance (O(1), sans parcours)"""
+        if maintenant is None:
+            maintenant = time.time()
+        courante = self._echeances.get((id_piece, type_capteur))
+        return courante is not None and courante[0] <= maintenant
+
+    def obtenir_obsoletes(self) -> List[Dict]:
+        """Retourne les capteurs actuellement obsolètes"""
+        self.collecter_expires()
+        with self._verrou:
+            return [asdict(evenement) for evenement in self._obsoletes.values()]
+
+    def derniere_sequence(self) -> int:
+        """Retourne le numéro de séquence du dernier événement d'obsolescence"""
+        return self._sequence
+
+    def obtenir_evenements(self, depuis: int = 0) -> List[Dict]:
+        """Retourne les événements d'obsolescence de séquence supérieure à `depuis`"""
+        self.collecter_expires()
+        resultat = []
+        with self._verrou:
+            for evenement in reversed(self._evenements):
+                if evenement.sequence <= depuis:
+                    break
+                resultat.append(asdict(evenement))
+        resultat.reverse()
+        return resultat